@@ -1,12 +1,30 @@
 import os
 import re
-import json
 import pdfplumber
+import pypdfium2 as pdfium
+import pytesseract
 from pathlib import Path
 import logging
 import argparse
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from layout import analyse_page
+from memory import (
+    DEFAULT_PAGE_WINDOW,
+    MemorySettings,
+    count_pdf_pages,
+    enforce_ceiling,
+    over_ceiling,
+)
+from metrics import METRICS, add_metrics_arguments, finish_metrics, profile, start_metrics
+from normalize import normalize
+from ocr import OcrPool, OcrSettings, render_page
+from cache import ExtractionCache
+from checkpoint import Checkpoint, DocumentTimeout, DocumentTimer
+from records import DOC_FIELDS, export_json, iter_page_records, write_record
+
 
 # === Logging Setup ===
 logging.basicConfig(
@@ -16,64 +34,567 @@ logging.basicConfig(
 )
 logger = logging.getLogger("extract_text")
 
+# Bump whenever extraction output changes, so cached pages are recomputed.
+EXTRACTOR_VERSION = "4"
+CACHE_NAMESPACE = "text"
+
+# Lines kept in the heading side channel: at most this many words, and bold,
+# larger than the body text, or numbered like a chapter/section heading.
+MAX_HEADING_WORDS = 12
+HEADING_SCALE = 1.15
+NUMBERED_HEADING_RE = re.compile(r"(?i)(?:chapter|section)\s+\d|\d+(?:\.\d+)+\s")
+
+
+def clean_text(text, medical=False):
+    """Normalise page text; see normalize.py for the exact transformations."""
+    return normalize(text, medical)
+
+
+def heading_spans(lines, text, medical=False):
+    """Heading side channel for a page: ``[offset, length, scale, bold]`` per heading-like line.
 
-def is_multi_column(page):
+    ``lines`` are the ``(line, font size, bold)`` tuples from the layout pass,
+    ``text`` the cleaned page text the offsets point into, and ``scale`` the
+    line's font size relative to the page's body text size.
+    """
+    weights = Counter()
+    for line, size, _ in lines:
+        weights[round(size, 1)] += len(line)
+    if not weights:
+        return []
+    body_size = weights.most_common(1)[0][0] or 1.0
+
+    spans = []
+    cursor = 0
+    for line, size, bold in lines:
+        line = clean_text(line, medical)
+        offset = text.find(line, cursor) if line else -1
+        if offset < 0:
+            continue
+        cursor = offset + len(line)
+        if len(line.split()) > MAX_HEADING_WORDS:
+            continue
+        scale = round(size / body_size, 2)
+        if bold or scale >= HEADING_SCALE or NUMBERED_HEADING_RE.match(line):
+            spans.append([offset, len(line), scale, int(bold)])
+    return spans
+
+
+def _apply_ocr(record, future, medical=False):
+    """Replace a sparse page's vector text with its OCR text when that finds more.
+
+    Returns False if tesseract is missing or failed; the record is left as is.
+    """
     try:
-        words = page.extract_words()
-        x_positions = sorted(set(w["x0"] for w in words))
-        gaps = [x_positions[i] - x_positions[i - 1] for i in range(1, len(x_positions))]
-        return any(g > 100 for g in gaps)
-    except Exception as e:
-        logger.warning(f"Multi-column detection failed: {e}")
+        ocr_text = clean_text(future.result(), medical)
+    except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError) as e:
+        logger.warning(f"OCR failed on page {record['page']}: {e}")
         return False
+    if len(ocr_text) > len(record["text"]):
+        record.update(text=ocr_text, headings=[], source="ocr")
+    return True
+
+
+def iter_pages(
+    pdf_path,
+    start=0,
+    end=None,
+    skip=frozenset(),
+    medical=False,
+    ocr=None,
+    memory=MemorySettings(),
+    timeout=None,
+    ocr_failed=None,
+):
+    """Yield cleaned text for the pages in ``[start, end)`` of a PDF as they finish.
 
+    Page numbers in ``skip`` (already cached) are not extracted. With ``ocr``
+    settings, pages whose vector text is shorter than ``ocr.min_chars`` are
+    rendered and OCR'd on a thread pool while later pages are analysed;
+    pages are still yielded in order, each with ``source`` ``vector`` or ``ocr``.
 
-def clean_text(text):
-    if not text:
-        return ""
+    The PDF is opened in windows of ``memory.page_window`` pages and every
+    page's caches are flushed once it is analysed, so memory does not grow
+    with the page count; see memory.py for the ``max_rss_mb`` ceiling.
+    Extraction raises ``DocumentTimeout`` once it has taken ``timeout`` seconds.
+    Pages whose OCR failed keep their vector text and are added to ``ocr_failed``.
+    """
+    name = os.path.basename(pdf_path)
+    timer = DocumentTimer(timeout, name)
+    with timer.running():
+        n_total = count_pdf_pages(pdf_path)
+    end = n_total if end is None else min(end, n_total)
+    timings = []
+    pool = renderer = None
+    pending = deque()
+    n_ocr = n_windows = 0
+    position = i = start
 
-    text = re.sub(r"(\w)-\s*\n\s*(\w)", r"\1\2", text)
-    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
-    text = re.sub(r"\n{2,}", "\n\n", text)
-    text = re.sub(r"\s{2,}", " ", text)
-    text = re.sub(r"^\s*\d+\s*$", "", text, flags=re.MULTILINE)
-    return text.strip()
+    def finish(record, future):
+        with timer.running():
+            if future is not None and not _apply_ocr(record, future, medical):
+                if ocr_failed is not None:
+                    ocr_failed.add(record["page"])
+        METRICS.count("pages", 1, "extract", name, source=record["source"])
+        return record
+
+    try:
+        while position < end:
+            window_end = min(position + memory.page_window, end) if memory.page_window else end
+            numbers = [n for n in range(position + 1, window_end + 1) if n not in skip]
+            position = window_end
+            if not numbers:
+                continue
+            n_windows += 1
+            with timer.running():
+                pdf = pdfplumber.open(pdf_path, pages=numbers)
+                pages = pdf.pages
+            with pdf:
+                for page in pages:
+                    i = page.page_number
+                    with timer.running():
+                        layout = analyse_page(page)
+                        page.close()
+                        timings.append(layout["seconds"])
+                        METRICS.observe("parse_seconds", layout["seconds"], "extract", name, i)
+                        logger.debug(
+                            f"{name} p{i}: {layout['n_words']} words, "
+                            f"{layout['columns']} column(s), {layout['seconds'] * 1000:.1f} ms"
+                        )
+                        with METRICS.timer("normalize_seconds", "extract", name, i):
+                            text = clean_text(layout["text"], medical)
+                            record = {
+                                "page": i,
+                                "text": text,
+                                "headings": heading_spans(layout["lines"], text, medical),
+                                "source": "vector",
+                            }
+
+                        future = None
+                        if ocr is not None and len(text) < ocr.min_chars:
+                            if pool is None:
+                                if ocr.tesseract_cmd:
+                                    pytesseract.pytesseract.tesseract_cmd = ocr.tesseract_cmd
+                                pool = OcrPool(ocr.workers)
+                                renderer = pdfium.PdfDocument(pdf_path)
+                            with METRICS.timer("render_seconds", "extract", name, i):
+                                image = render_page(renderer, i - 1, ocr.dpi)
+                            future = pool.submit(image, "extract", name, i)
+                            METRICS.count("ocr_pages", 1, "extract", name, i)
+                            n_ocr += 1
+                        pending.append((record, future))
+
+                    while pending and (pending[0][1] is None or pending[0][1].done()):
+                        yield finish(*pending.popleft())
+
+                    if i < window_end and over_ceiling(memory):
+                        # Close this window early; the next one starts after page i.
+                        METRICS.count("early_flushes", 1, "extract", name)
+                        position = i
+                        break
+            enforce_ceiling(memory, f"{name} p{i}")
+
+        while pending:
+            yield finish(*pending.popleft())
+    finally:
+        if pool is not None:
+            pool.close()
+            renderer.close()
+
+    if timings:
+        slowest = max(timings)
+        logger.info(
+            f"{name} p{start + 1}-{i}: {len(timings)} pages in {n_windows} window(s), "
+            f"{sum(timings):.2f}s layout, {sum(timings) / len(timings) * 1000:.1f} ms/page "
+            f"(slowest {slowest * 1000:.1f} ms), {n_ocr} sent to OCR"
+        )
+
+
+def extract_pages(
+    pdf_path,
+    start=0,
+    end=None,
+    skip=frozenset(),
+    medical=False,
+    ocr=None,
+    memory=MemorySettings(),
+    timeout=None,
+):
+    """Extract cleaned text for the pages in ``[start, end)`` of a PDF."""
+    return list(iter_pages(pdf_path, start, end, skip, medical, ocr, memory, timeout))
 
 
 def extract_pdf(pdf_path):
+    """Extract a whole PDF into the legacy per-file record and plain-text dump."""
     file_result = {
         "filename": os.path.basename(pdf_path),
         "processed_at": datetime.now().isoformat(),
-        "pages": [],
+        "pages": extract_pages(pdf_path),
     }
-    full_text = []
-
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages, start=1):
-            text = page.extract_text(layout=is_multi_column(page))
-            cleaned = clean_text(text)
-            file_result["pages"].append({"page": i, "text": cleaned})
-            full_text.append(
-                f"\n[File: {file_result['filename']} | Page {i}]\n{cleaned}"
+    full_text = [
+        format_page_text(file_result["filename"], p) for p in file_result["pages"]
+    ]
+    return file_result, "\n".join(full_text)
+
+
+def format_page_text(filename, page):
+    return f"\n[File: {filename} | Page {page['page']}]\n{page['text']}"
+
+
+def plan_tasks(jobs, pages_per_task, failures=None):
+    """Split every ``(pdf_path, skip)`` job into ``(pdf_path, start, end, skip)`` ranges.
+
+    PDFs that cannot even be opened are recorded in ``failures`` and left out.
+    """
+    tasks = []
+    for pdf_path, skip in jobs:
+        try:
+            n_pages = count_pdf_pages(pdf_path)
+        except Exception as e:
+            if failures is None:
+                raise
+            failures[pdf_path] = f"{type(e).__name__}: {e}"
+            continue
+        for start in range(0, max(n_pages, 1), pages_per_task):
+            end = min(start + pages_per_task, n_pages)
+            todo = range(start + 1, end + 1)
+            if all(i in skip for i in todo) and n_pages:
+                continue
+            tasks.append((pdf_path, start, end, frozenset(i for i in todo if i in skip)))
+    return tasks
+
+
+def _guarded_pages(pdf_path, failures, *args, **kwargs):
+    """``iter_pages`` that records a failing PDF in ``failures`` instead of raising."""
+    try:
+        yield from iter_pages(pdf_path, *args, **kwargs)
+    except (Exception, DocumentTimeout) as e:
+        failures[pdf_path] = f"{type(e).__name__}: {e}"
+
+
+def _extract_task(task):
+    failures = {}
+    ocr_failed = set()
+    pages = list(_guarded_pages(task[0], failures, *task[1:], ocr_failed=ocr_failed))
+    # Worker metrics travel back with the pages and are merged by the parent.
+    return pages, METRICS.drain(), failures.get(task[0]), ocr_failed
+
+
+def iter_parallel(
+    jobs,
+    workers,
+    pages_per_task=50,
+    medical=False,
+    ocr=None,
+    memory=MemorySettings(),
+    timeout=None,
+    failures=None,
+    ocr_failed=None,
+):
+    """Extract PDFs on a process pool, split across files and page ranges.
+
+    Yields ``(pdf_path, page)`` in task order, so file and page order match
+    the serial run exactly. Tasks are submitted lazily with at most two per
+    worker in flight. A failing task records its PDF in ``failures`` and the
+    PDF's later page ranges are dropped; ``timeout`` applies per task.
+    Pages whose OCR failed are added to ``ocr_failed[pdf_path]``.
+    """
+    failures = {} if failures is None else failures
+    ocr_failed = {} if ocr_failed is None else ocr_failed
+    tasks = plan_tasks(jobs, pages_per_task, failures)
+    logger.info(
+        f"Dispatching {len(tasks)} page-range tasks for {len(jobs)} PDFs "
+        f"to {workers} workers"
+    )
+
+    def collect(pdf_path, future):
+        pages, metrics, error, failed_pages = future.result()
+        METRICS.merge(metrics)
+        if pdf_path in failures:
+            return
+        if failed_pages:
+            ocr_failed.setdefault(pdf_path, set()).update(failed_pages)
+        if error is not None:
+            failures[pdf_path] = error
+        for page in pages:
+            yield pdf_path, page
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for task in tasks:
+            if task[0] in failures:
+                continue
+            pending.append(
+                (task[0], executor.submit(_extract_task, task + (medical, ocr, memory, timeout)))
             )
+            if len(pending) >= 2 * workers:
+                yield from collect(*pending.popleft())
+        while pending:
+            yield from collect(*pending.popleft())
 
-    return file_result, "\n".join(full_text)
 
+def _merge_pages(cached, fresh):
+    """Merge two page-ordered streams of page dicts."""
+    cached = iter(cached)
+    pending = next(cached, None)
+    for page in fresh:
+        while pending is not None and pending["page"] < page["page"]:
+            yield pending
+            pending = next(cached, None)
+        yield page
+    while pending is not None:
+        yield pending
+        pending = next(cached, None)
 
-def save_combined_outputs(all_json_data, all_text, output_folder):
-    json_output = output_folder / "all_extracted_data.json"
-    text_output = output_folder / "all_extracted_text.txt"
 
-    with open(json_output, "w", encoding="utf-8") as f_json:
-        json.dump(all_json_data, f_json, ensure_ascii=False, indent=2)
+def cache_version(medical=False, ocr=None):
+    """Cache version of the text output; medical rules and OCR settings change it."""
+    version = EXTRACTOR_VERSION
+    if medical:
+        version += "+medical"
+    if ocr is not None:
+        version += f"+ocr{ocr.dpi}:{ocr.min_chars}"
+    return version
+
+
+def backfill_cache(cache, version, records_path, missing, ocr=None):
+    """Cache pages that a resumed checkpoint already wrote to ``records_path``.
+
+    ``missing`` maps a filename to ``(doc_hash, page numbers)`` of pages that
+    are in the output but not in the cache. With ``ocr``, sparse vector pages
+    are left out, since the output does not say whether their OCR failed.
+    Returns the page numbers stored per filename.
+    """
+    stored = {name: set() for name in missing}
+    for record in iter_page_records(records_path):
+        doc_hash, pages = missing.get(record["filename"], (None, ()))
+        sparse = (
+            ocr is not None
+            and record.get("source") == "vector"
+            and len(record.get("text") or "") < ocr.min_chars
+        )
+        if record["page"] in pages and not sparse:
+            page = {k: v for k, v in record.items() if k not in DOC_FIELDS}
+            cache.put_page(doc_hash, CACHE_NAMESPACE, version, record["page"], page)
+            stored[record["filename"]].add(record["page"])
+    cache.commit()
+    return stored
+
+
+def iter_extracted_pages(
+    pdf_files,
+    workers=1,
+    pages_per_task=50,
+    cache=None,
+    medical=False,
+    ocr=None,
+    memory=MemorySettings(),
+    checkpoint=None,
+    timeout=None,
+):
+    """Yield one page record per extracted page, in file/page order.
+
+    With a ``cache``, documents whose content hash is already fully cached are
+    not opened at all, and partially cached documents only extract the
+    missing pages. With a resumed ``checkpoint``, pages it already holds are
+    not yielded again and quarantined PDFs are skipped. A PDF that fails or
+    exceeds ``timeout`` seconds of extraction is quarantined: its pages so far
+    are kept and the batch moves on.
+    """
+    version = cache_version(medical, ocr)
+    jobs = []
+    seen = set()
+    failures = {}
+    # Pages whose OCR failed are not cached, so a later run OCRs them again.
+    ocr_failed = {}
+    for pdf_path in pdf_files:
+        if checkpoint is not None and pdf_path.name in checkpoint.quarantined:
+            logger.warning(f"🚫 Skipping quarantined PDF: {pdf_path.name}")
+            continue
+        doc_hash, skip, complete = None, frozenset(), False
+        if cache is not None:
+            doc_hash = cache.file_hash(pdf_path)
+            # Byte-identical copies are served from the cache once the first is done.
+            complete = doc_hash in seen or cache.is_complete(
+                doc_hash, CACHE_NAMESPACE, version
+            )
+            seen.add(doc_hash)
+            if not complete:
+                skip = frozenset(
+                    cache.page_numbers(doc_hash, CACHE_NAMESPACE, version)
+                )
+        jobs.append((pdf_path, doc_hash, skip, complete))
+
+    done = {}
+    if checkpoint is not None:
+        done = {pdf_path: checkpoint.done.get(pdf_path.name, set()) for pdf_path, *_ in jobs}
+    if cache is not None and checkpoint is not None:
+        # Pages written before the interruption are not extracted again, so
+        # they reach the cache from the output file; otherwise the document
+        # would be marked complete without them.
+        missing = {
+            pdf_path.name: (doc_hash, done[pdf_path] - skip)
+            for pdf_path, doc_hash, skip, complete in jobs
+            if not complete and done[pdf_path] - skip
+        }
+        if missing:
+            checkpoint.files[0].flush()
+            stored = backfill_cache(
+                cache, version, Path(checkpoint.files[0].name), missing, ocr
+            )
+            jobs = [
+                (pdf_path, doc_hash, skip | stored.get(pdf_path.name, set()), complete)
+                for pdf_path, doc_hash, skip, complete in jobs
+            ]
+            logger.info(
+                f"Cache: back-filled {sum(map(len, stored.values()))} checkpointed pages"
+            )
+    # Pages already in the output are not extracted again, unless the cache
+    # still lacks them (checkpointed pages that could not be back-filled).
+    pending = [
+        (pdf_path, skip if cache is not None else skip | done.get(pdf_path, set()))
+        for pdf_path, _, skip, complete in jobs
+        if not complete
+    ]
+    if cache is not None:
+        logger.info(
+            f"Cache: {len(jobs) - len(pending)}/{len(jobs)} PDFs unchanged, "
+            f"{len(pending)} to extract"
+        )
+    if workers > 1 and pending:
+        fresh = iter_parallel(
+            pending, workers, pages_per_task, medical, ocr, memory, timeout, failures,
+            ocr_failed,
+        )
+    else:
+        fresh = (
+            (pdf_path, page)
+            for pdf_path, skip in pending
+            for page in _guarded_pages(
+                pdf_path, failures, skip=skip, medical=medical, ocr=ocr,
+                memory=memory, timeout=timeout,
+                ocr_failed=ocr_failed.setdefault(pdf_path, set()),
+            )
+        )
+
+    lookahead = [next(fresh, None)]
+
+    def fresh_pages(pdf_path):
+        while lookahead[0] is not None and lookahead[0][0] == pdf_path:
+            yield lookahead[0][1]
+            lookahead[0] = next(fresh, None)
+
+    for pdf_path, doc_hash, skip, complete in jobs:
+        if complete:
+            pages = cache.iter_pages(doc_hash, CACHE_NAMESPACE, version)
+        else:
+            logger.info(f"Processing: {pdf_path.name}")
+            cached = ()
+            if skip:
+                cached = (
+                    page
+                    for page in cache.iter_pages(
+                        doc_hash, CACHE_NAMESPACE, version
+                    )
+                    if page["page"] in skip
+                )
+            pages = _merge_pages(cached, fresh_pages(pdf_path))
+
+        processed_at = datetime.now().isoformat()
+        n_pages = n_cached = 0
+        already_done = done.get(pdf_path, ())
+        # With workers > 1 the profile only covers the parent's share of the work.
+        with profile(f"extract_{pdf_path.name}"):
+            for page in pages:
+                if cache is not None and not complete and page["page"] not in skip:
+                    if page["page"] not in ocr_failed.get(pdf_path, ()):
+                        cache.put_page(
+                            doc_hash, CACHE_NAMESPACE, version, page["page"], page
+                        )
+                elif cache is not None:
+                    METRICS.count("cached_pages", 1, "extract", pdf_path.name)
+                    n_cached += 1
+                n_pages += 1
+                if page["page"] not in already_done:
+                    yield {"filename": pdf_path.name, "processed_at": processed_at, **page}
+
+        if pdf_path in failures:
+            reason = failures[pdf_path]
+            logger.warning(f"🚫 Quarantined {pdf_path.name} after {n_pages} pages: {reason}")
+            METRICS.count("quarantined", 1, "extract", pdf_path.name)
+            if checkpoint is not None:
+                checkpoint.quarantine(pdf_path.name, reason)
+        elif (
+            cache is not None
+            and not complete
+            and n_cached == len(skip)
+            and not ocr_failed.get(pdf_path)
+        ):
+            cache.mark_complete(doc_hash, CACHE_NAMESPACE, version, n_pages)
+
+
+def open_checkpoint(output_folder, resume=False):
+    """Checkpoint manifest over the JSONL and TXT outputs of ``output_folder``."""
+    return Checkpoint(
+        output_folder / "checkpoint.jsonl",
+        [output_folder / "all_extracted_data.jsonl", output_folder / "all_extracted_text.txt"],
+        resume,
+    )
+
+
+def write_outputs(records, output_folder, checkpoint=None):
+    """Write page records to JSONL and the combined TXT, yielding each one on.
+
+    With a ``checkpoint`` (see ``open_checkpoint``) records are appended to
+    its files and every page is committed to the manifest once written.
+    """
+    records_output = output_folder / "all_extracted_data.jsonl"
+    text_output = output_folder / "all_extracted_text.txt"
 
-    with open(text_output, "w", encoding="utf-8") as f_text:
-        f_text.write(all_text)
+    n_pages = 0
+    if checkpoint is None:
+        f_records = open(records_output, "w", encoding="utf-8")
+        f_text = open(text_output, "w", encoding="utf-8")
+        current_file = None
+    else:
+        f_records, f_text = checkpoint.files
+        current_file = checkpoint.last_file
+    try:
+        for record in records:
+            write_record(f_records, record)
+            if record["filename"] != current_file:
+                if current_file is not None:
+                    f_text.write("\n\n")
+                current_file = record["filename"]
+            else:
+                f_text.write("\n")
+            f_text.write(format_page_text(current_file, record))
+            if checkpoint is not None:
+                checkpoint.commit(current_file, record["page"])
+            METRICS.count("rows_written", 1, "extract", current_file, output="jsonl")
+            n_pages += 1
+            yield record
+        if current_file is not None:
+            f_text.write("\n\n")
+    finally:
+        if checkpoint is None:
+            f_records.close()
+            f_text.close()
+        else:
+            f_records.flush()
+            f_text.flush()
 
-    logger.info(f"Combined JSON saved to: {json_output}")
+    logger.info(f"Page records ({n_pages} pages) saved to: {records_output}")
     logger.info(f"Combined TXT saved to: {text_output}")
 
 
+def save_outputs(records, output_folder, checkpoint=None):
+    """Stream page records to JSONL and the combined TXT as they arrive."""
+    for _ in write_outputs(records, output_folder, checkpoint):
+        pass
+    return output_folder / "all_extracted_data.jsonl"
+
+
 def main():
     parser = argparse.ArgumentParser(description="Extract text from PDFs.")
     parser.add_argument(
@@ -81,27 +602,126 @@ def main():
     )
 
     parser.add_argument("--output",type=str,default="outputs/extracted_text",help="Output folder for results",)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Number of worker processes (1 = serial)"
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default="outputs/cache/extraction_cache.db",
+        help="SQLite cache of extracted pages keyed by PDF content hash",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore and do not update the cache"
+    )
+    parser.add_argument(
+        "--export-json",
+        action="store_true",
+        help="Also write the legacy combined all_extracted_data.json",
+    )
+    parser.add_argument(
+        "--verbose", action="store_true", help="Log per-page layout timings"
+    )
+    parser.add_argument(
+        "--pages-per-task",
+        type=int,
+        default=50,
+        help="Page range size used to split large PDFs across workers",
+    )
+    parser.add_argument(
+        "--medical-normalize",
+        action="store_true",
+        help="Also normalise ligatures, unicode dashes and units (see normalize.py)",
+    )
+    parser.add_argument(
+        "--no-ocr", action="store_true", help="Never OCR pages with sparse vector text"
+    )
+    parser.add_argument(
+        "--ocr-dpi", type=int, default=300, help="Render resolution for page OCR"
+    )
+    parser.add_argument(
+        "--ocr-min-chars",
+        type=int,
+        default=50,
+        help="OCR pages whose vector text has fewer characters than this",
+    )
+    parser.add_argument(
+        "--ocr-workers", type=int, default=None, help="Concurrent OCR calls per process"
+    )
+    parser.add_argument(
+        "--tesseract-cmd",
+        type=str,
+        default=None,
+        help="Path to the tesseract executable if it is not on PATH",
+    )
+    parser.add_argument(
+        "--page-window",
+        type=int,
+        default=DEFAULT_PAGE_WINDOW,
+        help="Reopen each PDF every N pages to free parsed pages (0 = never)",
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=float,
+        default=None,
+        help="Resident memory ceiling: flush page caches early above it, fail if that is not enough",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from the checkpoint manifest in the output folder",
+    )
+    parser.add_argument(
+        "--doc-timeout",
+        type=float,
+        default=None,
+        help="Quarantine a PDF after this many seconds of extraction (per task with --workers)",
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    if args.verbose:
+        logger.setLevel(logging.DEBUG)
+    start_metrics(args)
 
     input_folder = Path(args.input)
     output_folder = Path(args.output)
     output_folder.mkdir(parents=True, exist_ok=True)
 
-    all_json_results = []
-    all_combined_text = ""
-
     pdf_files = list(input_folder.glob("*.pdf"))
     if not pdf_files:
         logger.warning("No PDF files found in the directory.")
         return
 
-    for pdf_path in pdf_files:
-        logger.info(f"Processing: {pdf_path.name}")
-        json_data, plain_text = extract_pdf(pdf_path)
-        all_json_results.append(json_data)
-        all_combined_text += plain_text + "\n\n"
+    cache = None if args.no_cache else ExtractionCache(Path(args.cache))
+    checkpoint = open_checkpoint(output_folder, args.resume)
+    ocr = None
+    if not args.no_ocr:
+        ocr = OcrSettings(
+            args.ocr_dpi, args.ocr_min_chars, args.ocr_workers, args.tesseract_cmd
+        )
+    records = iter_extracted_pages(
+        pdf_files,
+        args.workers,
+        args.pages_per_task,
+        cache=cache,
+        medical=args.medical_normalize,
+        ocr=ocr,
+        memory=MemorySettings(args.page_window, args.max_rss_mb),
+        checkpoint=checkpoint,
+        timeout=args.doc_timeout,
+    )
+    try:
+        records_output = save_outputs(records, output_folder, checkpoint)
+    finally:
+        checkpoint.close()
+        if cache is not None:
+            cache.close()
 
-    save_combined_outputs(all_json_results, all_combined_text, output_folder)
+    if args.export_json:
+        json_output = output_folder / "all_extracted_data.json"
+        export_json(iter_page_records(records_output), json_output)
+        logger.info(f"Combined JSON saved to: {json_output}")
+    finish_metrics(args)
     logger.info("✅ All PDFs processed and combined files saved.")
 
 
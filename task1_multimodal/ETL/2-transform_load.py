@@ -1,10 +1,14 @@
-import json
 import re
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, Iterator, Optional, Tuple
 import logging
 import argparse
 
+from dedup import DEDUP_MODES, DedupStats, dedup_pages
+from metrics import METRICS, add_metrics_arguments, finish_metrics, profile, start_metrics
+from records import export_json, iter_documents, iter_page_records, tee_jsonl
+from search_index import index_pages
+
 
 # === Logging Setup ===
 logging.basicConfig(
@@ -15,62 +19,105 @@ logging.basicConfig(
 logger = logging.getLogger("transform_load")
 
 
+# One pass, one pattern: the matching group names the heading level.
+HEADING_RE = re.compile(
+    r"(?P<chapter>(?i:chapter)\s+\d+)"  # "Chapter 1", "CHAPTER 2:"
+    r"|(?P<section>(?i:section)\s+\d+(?:\.\d+)*)"  # "Section 2.1 Something"
+    r"|(?P<subsection>\d+(?:\.\d+)+\s+\S)"  # "2.1.1 Introduction"
+)
+LINE_RE = re.compile(r"[^\n]+")
+LEVELS = {"chapter": 1, "section": 2, "subsection": 3}
+# Font size (relative to body text) from which an unnumbered heading counts
+# as a chapter or section; bold body-size headings are subsections.
+CHAPTER_SCALE = 1.5
+SECTION_SCALE = 1.15
+
+
+def heading_level(title: str, scale: float = 1.0, bold: bool = False) -> Optional[int]:
+    """Heading level (1-3) from numbering, else from font size and weight."""
+    match = HEADING_RE.match(title)
+    if match:
+        return LEVELS[match.lastgroup]
+    if scale >= CHAPTER_SCALE:
+        return 1
+    if scale >= SECTION_SCALE:
+        return 2
+    if bold:
+        return 3
+    return None
+
+
+def iter_heading_spans(page: Dict[str, Any]) -> Iterator[Tuple[int, int, str]]:
+    """Yield ``(offset, level, title)`` for the headings of a page, in reading order.
+
+    Uses the heading side channel written by stage 1; records without it
+    (older extractions) fall back to matching the text line by line.
+    """
+    text = page.get("text", "")
+    spans = page.get("headings")
+    if spans is None:
+        for line in LINE_RE.finditer(text):
+            title = line.group().strip()
+            match = HEADING_RE.match(title)
+            if match:
+                offset = line.start() + len(line.group()) - len(line.group().lstrip())
+                yield offset, LEVELS[match.lastgroup], title
+        return
+
+    for offset, length, scale, bold in spans:
+        title = text[offset : offset + length]
+        level = heading_level(title, scale, bool(bold))
+        if level is not None:
+            yield offset, level, title
+
+
+def iter_headings(page: Dict[str, Any]) -> Iterator[Tuple[int, str]]:
+    """Yield ``(level, title)`` for the headings of a page, in reading order."""
+    for _, level, title in iter_heading_spans(page):
+        yield level, title
+
+
 def detect_structure(text: str) -> Dict[str, str]:
     """Detect chapter, section, subsection titles from text."""
-    chapter = None
-    section = None
-    subsection = None
-
-    lines = text.split("\n")
-    for line in lines:
-        line = line.strip()
+    path = [None, None, None]
+    for level, title in iter_headings({"text": text}):
+        path[level - 1 :] = [title] + [None] * (3 - level)
+    return dict(zip(LEVELS, path))
 
-        if not line:
-            continue
 
-        # Chapter (e.g. "Chapter 1", "CHAPTER 2:")
-        if re.match(r"(?i)^chapter\s+\d+[:.\s-]*", line):
-            chapter = line
-            section = None
-            subsection = None
-            continue
+def iter_annotated_pages(pages: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Attach chapter/section info to each page of one document, in order.
 
-        # Section (e.g. "Section 2.1 Something", "Section 1.3")
-        if re.match(r"(?i)^section\s+\d+(\.\d+)*[:.\s-]*", line):
-            section = line
-            subsection = None
-            continue
+    The current heading path is carried across pages; a new heading replaces
+    its level and clears the levels below it.
+    """
+    path = [None, None, None]
 
-        # Subsection (e.g. "2.1.1 Introduction", "3.2.4")
-        if re.match(r"^\d+(\.\d+)+\s+.+", line):
-            subsection = line
-            continue
+    for page in pages:
+        document, number = page.get("filename"), page.get("page")
+        with METRICS.timer("structure_seconds", "transform", document, number):
+            n_headings = 0
+            for level, title in iter_headings(page):
+                path[level - 1 :] = [title] + [None] * (3 - level)
+                n_headings += 1
+        METRICS.count("headings", n_headings, "transform", document, number)
 
-    return {"chapter": chapter, "section": section, "subsection": subsection}
+        page["chapter"], page["section"], page["subsection"] = path
+        yield page
 
 
 def annotate_structure(doc: Dict[str, Any]) -> Dict[str, Any]:
     """Attach chapter/section info to each page."""
-    current_chapter = None
-    current_section = None
-    current_subsection = None
-
-    for page in doc.get("pages", []):
-        text = page.get("text", "")
-        structure = detect_structure(text)
-
-        if structure["chapter"]:
-            current_chapter = structure["chapter"]
-        if structure["section"]:
-            current_section = structure["section"]
-        if structure["subsection"]:
-            current_subsection = structure["subsection"]
+    for _ in iter_annotated_pages(doc.get("pages", [])):
+        pass
+    return doc
 
-        page["chapter"] = current_chapter
-        page["section"] = current_section
-        page["subsection"] = current_subsection
 
-    return doc
+def annotate_pages(records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """Streaming variant of ``annotate_structure`` over page records."""
+    for filename, pages in iter_documents(records):
+        with profile(f"transform_{filename}"):
+            yield from iter_annotated_pages(pages)
 
 
 def main():
@@ -80,31 +127,77 @@ def main():
     parser.add_argument(
         "--input",
         type=str,
-        default="outputs/extracted_text/all_extracted_data.json",
-        help="Path to input JSON file",
+        default="outputs/extracted_text/all_extracted_data.jsonl",
+        help="Path to input page records (JSONL, or legacy combined JSON)",
     )
     parser.add_argument(
         "--output",
         type=str,
-        default="outputs/extracted_text/extracted_data_cleaned.json",
-        help="Path to save cleaned JSON file",
+        default="outputs/extracted_text/extracted_data_cleaned.jsonl",
+        help="Path to save annotated page records (JSONL)",
+    )
+    parser.add_argument(
+        "--export-json",
+        type=str,
+        default=None,
+        help="Optional path for a legacy combined JSON export of the output",
     )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="mark",
+        help="Mark near-duplicate pages (duplicate_of), drop them, or skip the check",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="Estimated Jaccard similarity above which pages are near-duplicates",
+    )
+    parser.add_argument(
+        "--search-db",
+        type=str,
+        default="outputs/qa_data.db",
+        help="SQLite database holding the full-text page index",
+    )
+    parser.add_argument(
+        "--no-search-index",
+        action="store_true",
+        help="Do not rebuild the full-text page index",
+    )
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    start_metrics(args)
 
     input_path = Path(args.input)
     output_path = Path(args.output)
 
     logger.info(f"Starting transformation for file: {input_path}")
 
-    with open(input_path, "r", encoding="utf-8") as f:
-        docs: List[Dict[str, Any]] = json.load(f)
+    dedup_stats = DedupStats("pages")
+    records = dedup_pages(
+        annotate_pages(iter_page_records(input_path)),
+        args.dedup,
+        args.dedup_threshold,
+        dedup_stats,
+    )
+    records = tee_jsonl(records, output_path)
+    if not args.no_search_index:
+        records = index_pages(records, Path(args.search_db))
+
+    n_pages = 0
+    for _ in records:
+        n_pages += 1
 
-    structured_docs = [annotate_structure(doc) for doc in docs]
+    logger.info(f"Structured records ({n_pages} pages) saved to: {output_path}")
+    if args.dedup != "off":
+        dedup_stats.log()
 
-    with open(output_path, "w", encoding="utf-8") as f:
-        json.dump(structured_docs, f, ensure_ascii=False, indent=2)
+    if args.export_json:
+        export_json(iter_page_records(output_path), Path(args.export_json))
+        logger.info(f"Combined JSON saved to: {args.export_json}")
 
-    logger.info(f"Structured JSON saved to: {output_path}")
+    finish_metrics(args)
     logger.info("Transformation completed successfully ✅")
 
 
@@ -8,14 +8,28 @@ Generate diverse Question–Answer (Q&A) pairs from extracted medical text
 Use rule-based methods or simple NLP
 """
 
-import json
 import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import groupby, islice
 from pathlib import Path
-from typing import List, Dict
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 import logging
 import argparse
 from datetime import datetime
-import sqlite3
+
+from dedup import DEDUP_MODES, DedupStats, dedup_qa_pairs, qa_index, qa_text
+from metrics import METRICS, add_metrics_arguments, finish_metrics, profile, start_metrics
+from qa_rules import DEFAULT_RULESET, RuleSet
+from records import iter_page_records
+from search_index import rebuild_qa_index
+from storage import (
+    DEFAULT_BATCH_SIZE,
+    add_storage_arguments,
+    connect,
+    save_qa_pairs,
+    stable_id,
+)
 
 
 # Simple sentence tokenizer fallback to avoid external nltk dependency.
@@ -34,157 +48,250 @@ logging.basicConfig(
 )
 logger = logging.getLogger("qa_to_sqlite")
 
+DEFAULT_PAGES_PER_TASK = 64
+
 
 def extract_qa_from_text(
-    text: str, page: int, source_doc: str, start_id: int = 1
+    text: str, page: int, source_doc: str, rules: RuleSet = DEFAULT_RULESET
 ) -> List[Dict]:
-    """Extract Q&A pairs from text using simple rules."""
+    """Extract Q&A pairs from text using the registered rules (see qa_rules.py)."""
     qa_pairs = []
-    sentences = sent_tokenize(text)
-    qa_id = start_id
+    timestamp = datetime.now().isoformat()
 
+    sentences = sent_tokenize(text)
+    METRICS.count("sentences", len(sentences), "qa", source_doc, page)
     for sentence in sentences:
-        s = sentence.strip()
-        timestamp = datetime.now().isoformat()
-
-        # Definition rule
-        match = re.match(r"^([A-Z][a-zA-Z\s\-]+?) is (a|an|the) (.+)", s)
-        if match:
-            term, _, definition = match.groups()
+        for rule, question, answer in rules.match(sentence.strip()):
+            METRICS.count("rule_hits", 1, "qa", source_doc, page, rule=rule.name)
             qa_pairs.append(
                 {
-                    "id": f"qa_{qa_id:04d}",
-                    "question": f"What is {term.strip()}?",
-                    "answer": definition.strip().rstrip("."),
+                    "id": stable_id(
+                        "qa", source_doc, page, rule.category, question, answer
+                    ),
+                    "question": question,
+                    "answer": answer,
                     "source_document": source_doc,
                     "page_number": page,
                     "created_at": timestamp,
-                    "category": "definition",
+                    "category": rule.category,
                 }
             )
-            qa_id += 1
-
-        # Symptoms rule
-        match = re.match(r"^Symptoms of (.+?) include (.+?)\.", s)
-        if match:
-            condition, symptoms = match.groups()
-            qa_pairs.append(
-                {
-                    "id": f"qa_{qa_id:04d}",
-                    "question": f"What are the symptoms of {condition.strip()}?",
-                    "answer": symptoms.strip(),
-                    "source_document": source_doc,
-                    "page_number": page,
-                    "created_at": timestamp,
-                    "category": "symptoms",
-                }
-            )
-            qa_id += 1
-
-        # Treatment rule
-        match = re.match(r"^Treatment of (.+?) includes (.+?)\.", s)
-        if match:
-            condition, treatment = match.groups()
-            qa_pairs.append(
-                {
-                    "id": f"qa_{qa_id:04d}",
-                    "question": f"How is {condition.strip()} treated?",
-                    "answer": treatment.strip(),
-                    "source_document": source_doc,
-                    "page_number": page,
-                    "created_at": timestamp,
-                    "category": "treatment",
-                }
-            )
-            qa_id += 1
-
-        # Cause rule
-        match = re.match(r"^(.+?) is caused by (.+?)\.", s)
-        if match:
-            disease, cause = match.groups()
-            qa_pairs.append(
-                {
-                    "id": f"qa_{qa_id:04d}",
-                    "question": f"What causes {disease.strip()}?",
-                    "answer": cause.strip(),
-                    "source_document": source_doc,
-                    "page_number": page,
-                    "created_at": timestamp,
-                    "category": "cause",
-                }
-            )
-            qa_id += 1
 
     return qa_pairs
 
 
-def save_to_sqlite(db_path: Path, qa_pairs: List[Dict]):
-    """Save extracted Q&A pairs to SQLite database."""
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS qa_pairs (
-            id TEXT PRIMARY KEY,
-            question TEXT,
-            answer TEXT,
-            source_document TEXT,
-            page_number INTEGER,
-            created_at TEXT,
-            category TEXT
-        )
-    """
-    )
-
-    for qa in qa_pairs:
-        cur.execute(
-            """
-            INSERT OR REPLACE INTO qa_pairs VALUES (?, ?, ?, ?, ?, ?, ?)
-        """,
-            (
-                qa["id"],
-                qa["question"],
-                qa["answer"],
-                qa["source_document"],
-                qa["page_number"],
-                qa["created_at"],
-                qa["category"],
-            ),
-        )
-
-    conn.commit()
+def save_to_sqlite(
+    db_path: Path,
+    qa_pairs: Iterable[Dict],
+    journal_mode: str = "WAL",
+    synchronous: str = "NORMAL",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Stream Q&A pairs into the SQLite database in batches and re-index them."""
+    conn = connect(db_path, journal_mode, synchronous)
+    with METRICS.timer("sqlite_seconds", "qa", table="qa_pairs"):
+        n_rows = save_qa_pairs(conn, qa_pairs, batch_size)
+    with METRICS.timer("sqlite_seconds", "qa", table="qa_fts"):
+        rebuild_qa_index(conn)
     conn.close()
-    logger.info(f"✅ Saved {len(qa_pairs)} Q&A pairs to database: {db_path}")
-
-
-def process_documents(input_path: Path, db_path: Path, max_qas: int = 100):
-    """Load cleaned data, extract Q&A pairs, and save to SQLite."""
-    logger.info(f"📥 Loading cleaned data from: {input_path}")
-    with open(input_path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-
-    all_qas = []
-    current_id = 1
+    METRICS.count("rows_written", n_rows, "qa", table="qa_pairs")
+    logger.info(f"✅ Saved {n_rows} Q&A pairs to database: {db_path}")
+    return n_rows
 
-    for doc in data:
-        filename = doc.get("filename", "unknown.pdf")
-        pages = doc.get("pages", [])
 
-        for page in pages:
-            if len(all_qas) >= max_qas:
-                break
-            text = page.get("text", "")
-            page_num = page.get("page", 0)
-            qas = extract_qa_from_text(text, page_num, filename, current_id)
-            all_qas.extend(qas)
-            current_id += len(qas)
+def iter_page_qas(pages: Iterable[Dict], skip_documents=frozenset()) -> Iterator[List[Dict]]:
+    """Yield the Q&A pairs of each page, in page order.
 
-        if len(all_qas) >= max_qas:
+    Pages marked as near-duplicates by stage 2 are skipped, as are documents
+    in ``skip_documents`` (checked page by page, so it may grow meanwhile).
+    """
+    documents = groupby(pages, key=lambda page: page.get("filename", "unknown.pdf"))
+    for filename, doc_pages in documents:
+        with profile(f"qa_{filename}"):
+            for page in doc_pages:
+                if filename in skip_documents:
+                    break
+                if page.get("duplicate_of"):
+                    continue
+                page_num = page.get("page", 0)
+                with METRICS.timer("rules_seconds", "qa", filename, page_num):
+                    yield extract_qa_from_text(page.get("text", ""), page_num, filename)
+
+
+def _qa_task(pages: List[Dict], dedup: bool):
+    """Worker entry point: ``(qas, signatures)`` per page plus the worker's metrics.
+
+    The MinHash signatures for near-duplicate checks are computed here too, so
+    the parent only does the cheap LSH lookups.
+    """
+    index = qa_index()
+    results = [
+        (qas, [index.signature(qa_text(qa)) for qa in qas] if dedup else None)
+        for qas in iter_page_qas(pages)
+    ]
+    return results, METRICS.drain()
+
+
+def iter_parallel_qas(
+    pages: Iterable[Dict],
+    workers: int,
+    pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+    skip_documents=frozenset(),
+    dedup: bool = True,
+) -> Iterator[Tuple[List[Dict], Optional[List]]]:
+    """``iter_page_qas`` on a process pool, sharded into ``pages_per_task`` pages.
+
+    Yields ``(qas, signatures)`` per page (signatures only with ``dedup``).
+    Shards are dispatched lazily with at most two per worker in flight and
+    results come back in page order, so the output matches the serial run.
+    """
+    pages = iter(pages)
+    shards = (
+        [
+            {k: page.get(k) for k in ("filename", "page", "text", "duplicate_of")}
+            for page in shard
+            if page.get("filename", "unknown.pdf") not in skip_documents
+        ]
+        for shard in iter(lambda: list(islice(pages, pages_per_task)), [])
+    )
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for shard in shards:
+            pending.append(executor.submit(_qa_task, shard, dedup))
+            if len(pending) >= 2 * workers:
+                page_qas, metrics = pending.popleft().result()
+                METRICS.merge(metrics)
+                yield from page_qas
+        while pending:
+            page_qas, metrics = pending.popleft().result()
+            METRICS.merge(metrics)
+            yield from page_qas
+
+
+def fair_quotas(counts: Dict[str, int], limit: Optional[int]) -> Dict[str, int]:
+    """Split ``limit`` pairs across documents as evenly as their counts allow.
+
+    Every document gets the same share (capped at its own count); leftovers
+    go one each to the first documents that still have pairs.
+    """
+    if limit is None or sum(counts.values()) <= limit:
+        return dict(counts)
+    level, left = 0, limit
+    remaining = sorted(counts.values())
+    for i, count in enumerate(remaining):
+        share = len(remaining) - i
+        if (count - level) * share > left:
+            level += left // share
+            left %= share
             break
-
-    save_to_sqlite(db_path, all_qas)
-    logger.info(f"🏁 Q&A extraction completed. Total pairs: {len(all_qas)}")
+        left -= (count - level) * share
+        level = count
+    quotas = {}
+    for doc, count in counts.items():
+        quotas[doc] = min(count, level)
+        if left and count > level:
+            quotas[doc] += 1
+            left -= 1
+    return quotas
+
+
+def collect_qa_pairs(
+    pages: Iterable[Dict],
+    max_qas: Optional[int] = 100,
+    dedup: str = "drop",
+    dedup_threshold: float = 0.8,
+    per_doc: Optional[int] = None,
+    workers: int = 1,
+    pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+) -> Dict[str, List[Dict]]:
+    """Extract Q&A pairs from page records, grouped by document in page order.
+
+    No document can be given more than ``min(per_doc, max_qas)`` pairs (see
+    ``iter_kept_qas``), so collection stops there per document and memory is
+    bounded by the limits, not the corpus. With ``workers > 1`` the rules run
+    on a process pool; ids are content-derived, so they are the same either
+    way. Near-duplicate pairs are dropped (``dedup="drop"``) or only reported
+    (``"mark"``).
+    """
+    cap = per_doc
+    if max_qas is not None:
+        cap = max_qas if cap is None else min(cap, max_qas)
+    index = qa_index(dedup_threshold)
+    stats = DedupStats("Q&A pairs")
+    by_doc: Dict[str, List[Dict]] = {}
+    full = set()
+
+    pages = iter(pages)
+    if workers > 1:
+        page_qas = iter_parallel_qas(pages, workers, pages_per_task, full, dedup != "off")
+    else:
+        page_qas = ((qas, None) for qas in iter_page_qas(pages, full))
+    for qas, signatures in page_qas:
+        if not qas or qas[0]["source_document"] in full:
+            continue
+        doc_qas = by_doc.setdefault(qas[0]["source_document"], [])
+        doc_qas.extend(dedup_qa_pairs(qas, index, dedup, stats, signatures))
+        if cap is not None and len(doc_qas) >= cap:
+            del doc_qas[cap:]
+            full.add(qas[0]["source_document"])
+
+    if dedup != "off":
+        stats.log()
+    return by_doc
+
+
+def iter_kept_qas(by_doc: Dict[str, List[Dict]], max_qas: Optional[int] = 100) -> Iterator[Dict]:
+    """Yield the pairs kept once ``max_qas`` is shared fairly across documents
+    (see ``fair_quotas``) instead of going to whichever come first."""
+    quotas = fair_quotas({doc: len(qas) for doc, qas in by_doc.items()}, max_qas)
+    n_kept = sum(quotas.values())
+    if n_kept < sum(len(qas) for qas in by_doc.values()):
+        logger.info(f"🎯 Kept {n_kept} Q&A pairs from {len(by_doc)} documents")
+    for doc, qas in by_doc.items():
+        yield from qas[: quotas[doc]]
+
+
+def generate_qa_pairs(
+    pages: Iterable[Dict],
+    max_qas: Optional[int] = 100,
+    dedup: str = "drop",
+    dedup_threshold: float = 0.8,
+    per_doc: Optional[int] = None,
+    workers: int = 1,
+    pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+) -> List[Dict]:
+    """Extract Q&A pairs from page records; see ``collect_qa_pairs`` and ``iter_kept_qas``."""
+    by_doc = collect_qa_pairs(
+        pages, max_qas, dedup, dedup_threshold, per_doc, workers, pages_per_task
+    )
+    return list(iter_kept_qas(by_doc, max_qas))
+
+
+def process_documents(
+    input_path: Path,
+    db_path: Path,
+    max_qas: Optional[int] = 100,
+    dedup: str = "drop",
+    dedup_threshold: float = 0.8,
+    per_doc: Optional[int] = None,
+    workers: int = 1,
+    pages_per_task: int = DEFAULT_PAGES_PER_TASK,
+    **storage_options,
+):
+    """Stream cleaned page records, extract Q&A pairs, and save to SQLite."""
+    logger.info(f"📥 Streaming cleaned page records from: {input_path}")
+    by_doc = collect_qa_pairs(
+        iter_page_records(input_path),
+        max_qas,
+        dedup,
+        dedup_threshold,
+        per_doc,
+        workers,
+        pages_per_task,
+    )
+    # Kept pairs go straight into the batched inserts, without a combined list.
+    n_rows = save_to_sqlite(db_path, iter_kept_qas(by_doc, max_qas), **storage_options)
+    logger.info(f"🏁 Q&A extraction completed. Total pairs: {n_rows}")
 
 
 def main():
@@ -194,8 +301,8 @@ def main():
     parser.add_argument(
         "--input",
         type=str,
-        default="outputs/extracted_text/extracted_data_cleaned.json",
-        help="Path to input cleaned JSON file",
+        default="outputs/extracted_text/extracted_data_cleaned.jsonl",
+        help="Path to input cleaned page records (JSONL, or legacy combined JSON)",
     )
     parser.add_argument(
         "--db",
@@ -204,14 +311,60 @@ def main():
         help="Path to SQLite database output file",
     )
     parser.add_argument(
-        "--limit", type=int, default=100, help="Maximum number of Q&A pairs to generate"
+        "--limit",
+        type=int,
+        default=100,
+        help="Maximum number of Q&A pairs to generate, shared fairly across documents",
+    )
+    parser.add_argument(
+        "--per-doc-limit",
+        type=int,
+        default=None,
+        help="Maximum number of Q&A pairs per document",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for Q&A extraction"
     )
+    parser.add_argument(
+        "--pages-per-task",
+        type=int,
+        default=DEFAULT_PAGES_PER_TASK,
+        help="Pages sent to a worker at a time",
+    )
+    parser.add_argument(
+        "--dedup",
+        choices=DEDUP_MODES,
+        default="drop",
+        help="Drop near-duplicate Q&A pairs, only report them (mark), or skip the check",
+    )
+    parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=0.8,
+        help="Estimated Jaccard similarity above which pairs are near-duplicates",
+    )
+    add_storage_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    start_metrics(args)
 
     input_json = Path(args.input)
     db_path = Path(args.db)
 
-    process_documents(input_json, db_path, max_qas=args.limit)
+    process_documents(
+        input_json,
+        db_path,
+        max_qas=args.limit,
+        dedup=args.dedup,
+        dedup_threshold=args.dedup_threshold,
+        per_doc=args.per_doc_limit,
+        workers=args.workers,
+        pages_per_task=args.pages_per_task,
+        journal_mode=args.journal_mode,
+        synchronous=args.synchronous,
+        batch_size=args.batch_size,
+    )
+    finish_metrics(args)
 
 
 if __name__ == "__main__":
@@ -6,6 +6,16 @@ import logging
 import argparse
 from datetime import datetime
 
+from metrics import METRICS, add_metrics_arguments, finish_metrics, profile, start_metrics
+from qa_index import QAIndex
+from qa_rules import CATEGORIES
+from storage import (
+    DEFAULT_BATCH_SIZE,
+    add_storage_arguments,
+    connect,
+    save_conversation_rows,
+)
+
 
 # === Logging Setup ===
 logging.basicConfig(
@@ -21,15 +31,17 @@ def load_qa_pairs_from_db(db_path):
     conn = sqlite3.connect(db_path)
     cur = conn.cursor()
 
-    cur.execute(
-        """
-        SELECT id, question, answer, source_document, page_number, category
-        FROM qa_pairs
-        WHERE category IN ('symptoms', 'definition', 'treatment', 'cause')
-    """
-    )
-
-    rows = cur.fetchall()
+    placeholders = ", ".join("?" for _ in CATEGORIES)
+    with METRICS.timer("sqlite_seconds", "conversations", table="qa_pairs"):
+        cur.execute(
+            f"""
+            SELECT id, question, answer, source_document, page_number, category
+            FROM qa_pairs
+            WHERE category IN ({placeholders})
+        """,
+            CATEGORIES,
+        )
+        rows = cur.fetchall()
     conn.close()
 
     qa_pairs = [
@@ -49,50 +61,78 @@ def load_qa_pairs_from_db(db_path):
 
 
 # === 2. Build conversations ===
-def build_conversations(qa_pairs, num_conversations=10):
-    conversations = []
-    used_qas = set()
-
-    for conv_id in range(1, num_conversations + 1):
-        available_qas = [qa for qa in qa_pairs if qa["id"] not in used_qas]
-        if len(available_qas) < 3:
-            break
+def make_conversation(conv_id, selected_qas, topic="Medical Consultation"):
+    convo = {
+        "conversation_id": f"conv_{conv_id:03d}",
+        "topic": topic,
+        "created_at": datetime.now().isoformat(),
+        "turns": [],
+    }
+
+    turn_id = 1
+    for qa in selected_qas:
+        convo["turns"].append(
+            {
+                "turn_id": turn_id,
+                "speaker": "patient",
+                "text": simulate_patient_question(qa["question"]),
+            }
+        )
+        turn_id += 1
+
+        convo["turns"].append(
+            {
+                "turn_id": turn_id,
+                "speaker": "doctor",
+                "text": simulate_doctor_answer(qa["answer"]),
+                "source_reference": f"{qa['source_document']}:p{qa['page_number']}",
+            }
+        )
+        turn_id += 1
 
-        convo = {
-            "conversation_id": f"conv_{conv_id:03d}",
-            "topic": "Medical Consultation",
-            "created_at": datetime.now().isoformat(),
-            "turns": [],
-        }
+    METRICS.count("turns", len(convo["turns"]), "conversations")
+    return convo
 
-        k = min(len(available_qas), random.randint(3, 5))
-        selected_qas = random.sample(available_qas, k=k)
 
-        turn_id = 1
-        for qa in selected_qas:
-            used_qas.add(qa["id"])
+def iter_conversations(qa_pairs, num_conversations=10, seed=None, strategy="topic"):
+    """Yield conversations of 3-5 Q&A pairs drawn without replacement.
 
-            convo["turns"].append(
-                {
-                    "turn_id": turn_id,
-                    "speaker": "patient",
-                    "text": simulate_patient_question(qa["question"]),
-                }
-            )
-            turn_id += 1
-
-            convo["turns"].append(
-                {
-                    "turn_id": turn_id,
-                    "speaker": "doctor",
-                    "text": simulate_doctor_answer(qa["answer"]),
-                    "source_reference": f"{qa['source_document']}:p{qa['page_number']}",
-                }
+    With ``strategy="topic"`` each conversation starts from a random pair and
+    is filled with related pairs (same document/term) through an inverted
+    index; ``"random"`` draws unrelated pairs. Both shuffle once and never
+    rescan the pair list, so building ``n`` conversations is linear. A
+    ``seed`` makes the draw reproducible.
+    """
+    rng = random.Random(seed)
+    if strategy == "topic":
+        index = QAIndex(qa_pairs, rng)
+        for conv_id in range(1, num_conversations + 1):
+            picked = index.draw_related(rng.randint(3, 5))
+            if len(picked) < 3:
+                break
+            yield make_conversation(
+                conv_id, [qa_pairs[i] for i in picked], topic=index.topic(picked)
             )
-            turn_id += 1
+        return
+
+    order = list(range(len(qa_pairs)))
+    rng.shuffle(order)
 
-        conversations.append(convo)
+    position = 0
+    for conv_id in range(1, num_conversations + 1):
+        remaining = len(order) - position
+        if remaining < 3:
+            break
+        k = min(remaining, rng.randint(3, 5))
+        selected_qas = [qa_pairs[i] for i in order[position : position + k]]
+        position += k
+        yield make_conversation(conv_id, selected_qas)
 
+
+def build_conversations(qa_pairs, num_conversations=10, seed=None, strategy="topic"):
+    conversations = list(
+        iter_conversations(qa_pairs, num_conversations, seed, strategy)
+    )
     logger.info(f"💬 Generated {len(conversations)} conversations")
     return conversations
 
@@ -100,7 +140,17 @@ def build_conversations(qa_pairs, num_conversations=10):
 # === 3. Simulate Q&A dialog ===
 def simulate_patient_question(original_q):
     lower_q = original_q.lower()
-    if "what are the symptoms" in lower_q:
+    if "what is the dose" in lower_q:
+        return "How much of this medicine should I take?"
+    elif "risk factors" in lower_q:
+        return "Am I at risk of getting this condition?"
+    elif "complications" in lower_q:
+        return "Could this lead to any complications?"
+    elif "diagnosed" in lower_q:
+        return "How will you find out if I have this condition?"
+    elif "prevented" in lower_q:
+        return "How can I avoid getting this?"
+    elif "what are the symptoms" in lower_q:
         return "I've been feeling unwell lately. Could these be symptoms of something serious?"
     elif "how is" in lower_q:
         return "How can this condition be treated?"
@@ -116,39 +166,30 @@ def simulate_doctor_answer(answer):
 
 
 # === 4. Save conversations to SQLite ===
-def save_conversations_to_db(db_path, conversations):
-    conn = sqlite3.connect(db_path)
-    cur = conn.cursor()
-
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS conversations (
-            conversation_id TEXT PRIMARY KEY,
-            topic TEXT,
-            created_at TEXT,
-            content TEXT
+def save_conversations_to_db(
+    db_path,
+    conversations,
+    journal_mode="WAL",
+    synchronous="NORMAL",
+    batch_size=DEFAULT_BATCH_SIZE,
+):
+    conn = connect(db_path, journal_mode, synchronous)
+    rows = (
+        (
+            convo["conversation_id"],
+            convo["topic"],
+            convo["created_at"],
+            json.dumps(convo, ensure_ascii=False, indent=2),
         )
-    """
+        for convo in conversations
     )
-
-    for convo in conversations:
-        content_json = json.dumps(convo, ensure_ascii=False, indent=2)
-        cur.execute(
-            """
-            INSERT OR REPLACE INTO conversations (conversation_id, topic, created_at, content)
-            VALUES (?, ?, ?, ?)
-        """,
-            (
-                convo["conversation_id"],
-                convo["topic"],
-                convo["created_at"],
-                content_json,
-            ),
-        )
-
-    conn.commit()
+    # Conversations are generated lazily, so this includes building them.
+    with METRICS.timer("save_seconds", "conversations", table="conversations"):
+        n_rows = save_conversation_rows(conn, rows, batch_size)
     conn.close()
-    logger.info(f"✅ Saved {len(conversations)} conversations to database: {db_path}")
+    METRICS.count("rows_written", n_rows, "conversations", table="conversations")
+    logger.info(f"✅ Saved {n_rows} conversations to database: {db_path}")
+    return n_rows
 
 
 # === 5. Main flow ===
@@ -168,16 +209,41 @@ def main():
         default=10,
         help="Number of conversations to generate",
     )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random seed for reproducible sampling"
+    )
+    parser.add_argument(
+        "--strategy",
+        choices=["topic", "random"],
+        default="topic",
+        help="Group related Q&A pairs per conversation, or sample them at random",
+    )
+    add_storage_arguments(parser)
+    add_metrics_arguments(parser)
     args = parser.parse_args()
+    start_metrics(args)
 
     db_path = Path(args.db)
 
     logger.info("🚀 Starting conversation generation pipeline...")
-    qa_pairs = load_qa_pairs_from_db(db_path)
-    conversations = build_conversations(
-        qa_pairs, num_conversations=args.num_conversations
-    )
-    save_conversations_to_db(db_path, conversations)
+    # Conversations have no source document; the whole run is one profile.
+    with profile("conversations"):
+        qa_pairs = load_qa_pairs_from_db(db_path)
+        # Conversations are streamed straight into batched inserts.
+        conversations = iter_conversations(
+            qa_pairs,
+            num_conversations=args.num_conversations,
+            seed=args.seed,
+            strategy=args.strategy,
+        )
+        save_conversations_to_db(
+            db_path,
+            conversations,
+            journal_mode=args.journal_mode,
+            synchronous=args.synchronous,
+            batch_size=args.batch_size,
+        )
+    finish_metrics(args)
     logger.info("🏁 Conversation generation completed successfully!")
 
 
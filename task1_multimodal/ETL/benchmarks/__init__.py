@@ -0,0 +1,2 @@
+"""Benchmarks for the ETL stages: a synthetic corpus generator, an end-to-end
+stage suite and micro-benchmarks (run from the ETL folder with ``python -m``)."""
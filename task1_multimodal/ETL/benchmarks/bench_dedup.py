@@ -0,0 +1,97 @@
+"""
+bench_dedup.py
+==============
+
+Texts/sec and recall of MinHash/LSH near-duplicate detection as the corpus
+grows, against exact pairwise Jaccard on the same shingles (the ``n²``
+baseline is only run up to ``--exact-max`` texts). Run from the ETL folder::
+
+    python -m benchmarks.bench_dedup --texts 1000 5000 20000
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from dedup import NearDuplicateIndex, shingle_hashes
+from benchmarks.bench_qa_rules import WORDS
+
+
+def synthetic_texts(n: int, dup_rate: float, seed: int = 0) -> List[str]:
+    """Random 'pages'; a ``dup_rate`` share are earlier pages with ~1% of words edited."""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        if texts and rng.random() < dup_rate:
+            words = rng.choice(texts).split()
+            for _ in range(max(1, len(words) // 100)):
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+        else:
+            words = rng.choices(WORDS, k=rng.randint(150, 400))
+        texts.append(" ".join(words))
+    return texts
+
+
+def run_exact(texts: List[str], threshold: float) -> List[bool]:
+    sets = [set(shingle_hashes(t, 5).tolist()) for t in texts]
+    kept: List[int] = []
+    flags = []
+    for i, s in enumerate(sets):
+        dup = any(len(s & sets[j]) >= threshold * len(s | sets[j]) for j in kept)
+        if not dup:
+            kept.append(i)
+        flags.append(dup)
+    return flags
+
+
+def run_lsh(texts: List[str], threshold: float) -> List[bool]:
+    index = NearDuplicateIndex(threshold, shingle_size=5)
+    return [index.check(i, t) is not None for i, t in enumerate(texts)]
+
+
+def bench(n: int, dup_rate: float, threshold: float, exact_max: int) -> Dict:
+    texts = synthetic_texts(n, dup_rate)
+    result = {"texts": n}
+    started = time.perf_counter()
+    lsh = run_lsh(texts, threshold)
+    result["lsh_texts_per_sec"] = round(n / (time.perf_counter() - started))
+    result["lsh_duplicates"] = sum(lsh)
+    if n <= exact_max:
+        started = time.perf_counter()
+        exact = run_exact(texts, threshold)
+        result["exact_texts_per_sec"] = round(n / (time.perf_counter() - started))
+        result["exact_duplicates"] = sum(exact)
+        found = sum(a and b for a, b in zip(lsh, exact))
+        result["recall"] = round(found / max(1, sum(exact)), 4)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate detection.")
+    parser.add_argument("--texts", type=int, nargs="+", default=[1000, 5000, 20000])
+    parser.add_argument("--dup-rate", type=float, default=0.2)
+    parser.add_argument("--threshold", type=float, default=0.8)
+    parser.add_argument(
+        "--exact-max", type=int, default=2000, help="Largest corpus for the n² baseline"
+    )
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    results = [bench(n, args.dup_rate, args.threshold, args.exact_max) for n in args.texts]
+
+    print(f"{'texts':>7} {'lsh t/s':>10} {'exact t/s':>10} {'recall':>7}")
+    for r in results:
+        print(
+            f"{r['texts']:>7} {r['lsh_texts_per_sec']:>10,} "
+            f"{r.get('exact_texts_per_sec', '-'):>10} {r.get('recall', '-'):>7}"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+bench_normalize.py
+==================
+
+Golden check and MB/s micro-benchmark for the page text normaliser.
+
+The golden check runs the layout pass over every page of the sample PDFs
+(plus a few edge cases) and requires ``normalize`` to give exactly the output
+of the original five-pass ``clean_text``; the script exits non-zero on any
+difference. The benchmark then times both on the same raw page texts. Run
+from the ETL folder::
+
+    python -m benchmarks.bench_normalize --input ../pdfs
+"""
+
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import pdfplumber
+
+from layout import analyse_page
+from normalize import normalize
+
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "12",
+    " 7 \n",
+    "treat-\nment of chol-  \n  era",
+    "line one\nline two\n\nnew paragraph\n\n\n\nlast",
+    "tabs\tand \t\n spaces   everywhere",
+    "page 3\n4\n",
+    "\r\nwindows\r\nline endings\r\n",
+    "no-break space and  two",
+]
+
+
+def legacy_clean_text(text):
+    """The original ``clean_text`` from 1-extract_text.py, kept as the golden reference."""
+    if not text:
+        return ""
+
+    text = re.sub(r"(\w)-\s*\n\s*(\w)", r"\1\2", text)
+    text = re.sub(r"(?<!\n)\n(?!\n)", " ", text)
+    text = re.sub(r"\n{2,}", "\n\n", text)
+    text = re.sub(r"\s{2,}", " ", text)
+    text = re.sub(r"^\s*\d+\s*$", "", text, flags=re.MULTILINE)
+    return text.strip()
+
+
+def raw_page_texts(pdf_dir: Path) -> List[str]:
+    texts = []
+    for pdf_path in sorted(pdf_dir.glob("*.pdf")):
+        with pdfplumber.open(pdf_path) as pdf:
+            texts += [analyse_page(page)["text"] for page in pdf.pages]
+    return texts
+
+
+def golden_check(texts: List[str]) -> int:
+    """Number of texts where ``normalize`` differs from the legacy output."""
+    failures = 0
+    for i, text in enumerate(texts):
+        expected, actual = legacy_clean_text(text), normalize(text)
+        if expected != actual:
+            failures += 1
+            print(f"❌ text {i}: expected {expected[:80]!r}, got {actual[:80]!r}")
+    return failures
+
+
+def megabytes_per_second(fn: Callable[[str], str], texts: List[str], repeat: int) -> float:
+    size = sum(len(t.encode("utf-8")) for t in texts) * repeat
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return size / (time.perf_counter() - started) / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check and benchmark the text normaliser.")
+    parser.add_argument("--input", type=str, default="../pdfs", help="Folder of sample PDFs")
+    parser.add_argument("--repeat", type=int, default=50, help="Passes over the corpus")
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    texts = raw_page_texts(Path(args.input))
+    failures = golden_check(texts + EDGE_CASES)
+    print(f"golden check: {len(texts)} pages + {len(EDGE_CASES)} edge cases, {failures} failures")
+    if failures:
+        sys.exit(1)
+
+    results: Dict[str, float] = {
+        "legacy_mb_per_sec": megabytes_per_second(legacy_clean_text, texts, args.repeat),
+        "normalize_mb_per_sec": megabytes_per_second(normalize, texts, args.repeat),
+        "normalize_medical_mb_per_sec": megabytes_per_second(
+            lambda t: normalize(t, medical=True), texts, args.repeat
+        ),
+    }
+    for name, value in results.items():
+        print(f"{name:<30} {value:8.1f}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
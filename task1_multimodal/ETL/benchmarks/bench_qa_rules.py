@@ -0,0 +1,126 @@
+"""
+bench_qa_rules.py
+=================
+
+Sentences/sec of Q&A rule matching as the number of rules grows.
+
+Compares the anchored ``RuleSet`` from qa_rules.py with the previous approach
+(one uncompiled ``re.match`` per rule per sentence plus a timestamp per
+sentence). Run from the ETL folder::
+
+    python -m benchmarks.bench_qa_rules --rules 4 10 25 50 100
+"""
+
+import argparse
+import json
+import random
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+from qa_rules import RULES, QARule, RuleSet
+
+
+WORDS = (
+    "patient fever cholera dehydration stool fluid oral rehydration saline "
+    "blood pressure kidney liver hepatitis insulin glucose clinic village water "
+    "report history examination therapy infection chronic acute severe mild"
+).split()
+
+TEMPLATES = [
+    "Cholera is an acute diarrhoeal infection caused by ingestion of contaminated food.",
+    "Symptoms of cholera include watery diarrhoea and vomiting.",
+    "Treatment of dehydration includes oral rehydration salts.",
+    "Hepatitis A is caused by a virus spread through contaminated water.",
+    "The recommended dose of doxycycline is 300 mg once.",
+]
+
+
+def synthetic_rules(n: int) -> List[QARule]:
+    """Built-in rules first, padded with distinct keyword-anchored rules."""
+    rules = list(RULES[:n])
+    for i in range(len(rules), n):
+        kw = f"rulekw{i}"
+        rules.append(
+            QARule(
+                f"synthetic_{i}",
+                f"synthetic_{i}",
+                re.compile(rf"^(.+?) {kw} (.+?)\."),
+                (f" {kw} ",),
+                lambda m: (f"What about {m.group(1)}?", m.group(2)),
+            )
+        )
+    return rules
+
+
+def synthetic_sentences(n: int, hit_rate: float, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    sentences = []
+    for _ in range(n):
+        if rng.random() < hit_rate:
+            sentences.append(rng.choice(TEMPLATES))
+        else:
+            words = rng.choices(WORDS, k=rng.randint(8, 25))
+            sentences.append(" ".join(words).capitalize() + ".")
+    return sentences
+
+
+def run_legacy(sentences: List[str], rules: List[QARule]) -> int:
+    """The pre-registry loop: uncompiled patterns, timestamp per sentence."""
+    patterns = [r.pattern.pattern for r in rules]
+    hits = 0
+    for s in sentences:
+        datetime.now().isoformat()
+        for pattern in patterns:
+            if re.match(pattern, s):
+                hits += 1
+    return hits
+
+
+def run_ruleset(sentences: List[str], rules: List[QARule]) -> int:
+    ruleset = RuleSet(rules)
+    datetime.now().isoformat()
+    return sum(len(ruleset.match(s)) for s in sentences)
+
+
+def bench(n_rules: int, sentences: List[str]) -> Dict:
+    rules = synthetic_rules(n_rules)
+    result = {"rules": n_rules, "sentences": len(sentences)}
+    for name, fn in (("legacy", run_legacy), ("ruleset", run_ruleset)):
+        started = time.perf_counter()
+        hits = fn(sentences, rules)
+        elapsed = time.perf_counter() - started
+        result[f"{name}_sentences_per_sec"] = round(len(sentences) / elapsed)
+        result[f"{name}_hits"] = hits
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Q&A rule matching.")
+    parser.add_argument("--rules", type=int, nargs="+", default=[4, 10, 25, 50, 100])
+    parser.add_argument("--sentences", type=int, default=50_000)
+    parser.add_argument(
+        "--hit-rate", type=float, default=0.05, help="Share of sentences matching a rule"
+    )
+    parser.add_argument("--output", type=str, default=None, help="Optional JSON results path")
+    args = parser.parse_args()
+
+    sentences = synthetic_sentences(args.sentences, args.hit_rate)
+    results = [bench(n, sentences) for n in args.rules]
+
+    print(f"{'rules':>6} {'legacy s/s':>12} {'ruleset s/s':>12} {'speedup':>8}")
+    for r in results:
+        speedup = r["ruleset_sentences_per_sec"] / r["legacy_sentences_per_sec"]
+        print(
+            f"{r['rules']:>6} {r['legacy_sentences_per_sec']:>12,} "
+            f"{r['ruleset_sentences_per_sec']:>12,} {speedup:>7.1f}x"
+        )
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+
+
+if __name__ == "__main__":
+    main()
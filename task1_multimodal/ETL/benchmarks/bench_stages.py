@@ -0,0 +1,329 @@
+"""
+bench_stages.py
+===============
+
+End-to-end throughput of every ETL stage on a synthetic corpus.
+
+Generates synthetic PDFs (see synthetic.py), then runs each stage in a fresh
+process, with its peak RSS reset so the peak is its own, and reports
+pages/sec, sentences/sec and rows/sec. With ``--scanned`` the extract stage
+OCRs the scanned pages (tesseract needed) and reports how many it sent to
+OCR. Results are written as JSON; ``--compare`` checks them against an
+earlier results file and exits non-zero when a throughput drops by more than
+``--tolerance``. Run from the ETL folder::
+
+    python -m benchmarks.bench_stages --docs 4 --pages 50 --columns 2 --output bench.json
+    python -m benchmarks.bench_stages --compare bench.json
+"""
+
+import argparse
+import importlib
+import json
+import logging
+import platform
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+STAGES = ["extract", "images", "transform", "chunk", "qa", "conversations", "export"]
+DEFAULT_STAGES = ["extract", "transform", "chunk", "qa", "conversations", "export"]
+
+
+def reset_peak_rss() -> bool:
+    """Restart this process's peak RSS from its current size (Linux only).
+
+    A child process inherits its parent's ``ru_maxrss``, so without a reset
+    every stage would report at least the parent's footprint.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Peak resident set size of this process (None where unsupported).
+
+    Reads ``VmHWM``, which ``reset_peak_rss`` can reset, where available.
+    """
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"^VmHWM:\s+(\d+) kB", f.read(), re.MULTILINE)
+        if match:
+            return round(int(match.group(1)) / 1024, 1)
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes.
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def _rate(count: int, seconds: float) -> float:
+    return round(count / seconds, 1) if seconds > 0 else 0.0
+
+
+def _quiet():
+    logging.disable(logging.WARNING)
+
+
+def bench_extract(work: Path, config: Dict) -> Dict:
+    from metrics import METRICS
+    from ocr import OcrSettings
+
+    extract_text = importlib.import_module("1-extract_text")
+    pdf_files = sorted((work / "pdfs").glob("*.pdf"))
+    out = work / "extracted_text"
+    out.mkdir(exist_ok=True)
+    # Scanned pages only take the OCR path with OCR settings.
+    ocr = OcrSettings() if config["scanned"] > 0 else None
+    started = time.perf_counter()
+    n_pages = sum(
+        1
+        for _ in extract_text.write_outputs(
+            extract_text.iter_extracted_pages(pdf_files, config["workers"], ocr=ocr), out
+        )
+    )
+    seconds = time.perf_counter() - started
+    n_ocr = sum(v for (name, _), v in METRICS.counters.items() if name == "ocr_pages")
+    return {
+        "pages": n_pages,
+        "ocr_pages": int(n_ocr),
+        "seconds": seconds,
+        "pages_per_sec": _rate(n_pages, seconds),
+    }
+
+
+def bench_images(work: Path, config: Dict) -> Dict:
+    from extract_image import extract_images
+
+    started = time.perf_counter()
+    n_images = extract_images(work / "pdfs", work / "images", work / "image_text_pairs.json")
+    seconds = time.perf_counter() - started
+    return {"images": n_images, "seconds": seconds, "images_per_sec": _rate(n_images, seconds)}
+
+
+def bench_transform(work: Path, config: Dict) -> Dict:
+    from dedup import dedup_pages
+    from records import iter_page_records, tee_jsonl
+    from search_index import index_pages
+
+    transform_load = importlib.import_module("2-transform_load")
+    source = iter_page_records(work / "extracted_text" / "all_extracted_data.jsonl")
+    started = time.perf_counter()
+    records = index_pages(
+        tee_jsonl(
+            dedup_pages(transform_load.annotate_pages(source)),
+            work / "extracted_text" / "extracted_data_cleaned.jsonl",
+        ),
+        work / "qa_data.db",
+    )
+    n_pages = sum(1 for _ in records)
+    seconds = time.perf_counter() - started
+    return {"pages": n_pages, "seconds": seconds, "pages_per_sec": _rate(n_pages, seconds)}
+
+
+def bench_chunk(work: Path, config: Dict) -> Dict:
+    from chunking import ChunkWriter
+    from records import iter_page_records
+
+    writer = ChunkWriter(work / "extracted_text" / "chunks.jsonl", work / "qa_data.db")
+    source = iter_page_records(work / "extracted_text" / "extracted_data_cleaned.jsonl")
+    started = time.perf_counter()
+    n_pages = sum(1 for _ in writer.tee(source))
+    seconds = time.perf_counter() - started
+    return {
+        "pages": n_pages,
+        "rows": writer.n_chunks,
+        "seconds": seconds,
+        "pages_per_sec": _rate(n_pages, seconds),
+        "rows_per_sec": _rate(writer.n_chunks, seconds),
+    }
+
+
+def bench_qa(work: Path, config: Dict) -> Dict:
+    from records import iter_page_records
+
+    generate_qa_pairs = importlib.import_module("3-generate_qa_pairs")
+    pages = list(iter_page_records(work / "extracted_text" / "extracted_data_cleaned.jsonl"))
+    n_sentences = sum(len(generate_qa_pairs.sent_tokenize(p["text"])) for p in pages)
+
+    started = time.perf_counter()
+    qa_pairs = generate_qa_pairs.generate_qa_pairs(pages, max_qas=sys.maxsize)
+    extract_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    generate_qa_pairs.save_to_sqlite(work / "qa_data.db", qa_pairs)
+    save_seconds = time.perf_counter() - started
+    return {
+        "pages": len(pages),
+        "sentences": n_sentences,
+        "rows": len(qa_pairs),
+        "seconds": extract_seconds + save_seconds,
+        "sentences_per_sec": _rate(n_sentences, extract_seconds),
+        "rows_per_sec": _rate(len(qa_pairs), save_seconds),
+    }
+
+
+def bench_conversations(work: Path, config: Dict) -> Dict:
+    create_conversations = importlib.import_module("4-create_conversations")
+    db_path = work / "qa_data.db"
+    started = time.perf_counter()
+    qa_pairs = create_conversations.load_qa_pairs_from_db(db_path)
+    conversations = create_conversations.iter_conversations(
+        qa_pairs, num_conversations=max(1, len(qa_pairs) // 4), seed=0
+    )
+    n_rows = create_conversations.save_conversations_to_db(db_path, conversations)
+    seconds = time.perf_counter() - started
+    return {"rows": n_rows, "seconds": seconds, "rows_per_sec": _rate(n_rows, seconds)}
+
+
+def bench_export(work: Path, config: Dict) -> Dict:
+    from export_parquet import export_tables
+
+    started = time.perf_counter()
+    counts = export_tables(work, work / "parquet")
+    seconds = time.perf_counter() - started
+    n_rows = sum(counts.values())
+    return {"rows": n_rows, "seconds": seconds, "rows_per_sec": _rate(n_rows, seconds)}
+
+
+BENCHES = {
+    "extract": bench_extract,
+    "images": bench_images,
+    "transform": bench_transform,
+    "chunk": bench_chunk,
+    "qa": bench_qa,
+    "conversations": bench_conversations,
+    "export": bench_export,
+}
+
+
+def _run_stage(name: str, work: str, config: Dict) -> Dict:
+    reset_peak_rss()
+    result = BENCHES[name](Path(work), config)
+    result["seconds"] = round(result["seconds"], 3)
+    result["peak_rss_mb"] = peak_rss_mb()
+    return result
+
+
+def in_fresh_process(fn, *args):
+    """Run ``fn(*args)`` in a fresh interpreter and return its result."""
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=get_context("spawn"), initializer=_quiet
+    ) as executor:
+        return executor.submit(fn, *args).result()
+
+
+def run_stage(name: str, work: Path, config: Dict) -> Dict:
+    """Run one stage in a fresh interpreter so peak RSS is measured per stage."""
+    return in_fresh_process(_run_stage, name, str(work), config)
+
+
+def _prepare_corpus(work: str, config: Dict) -> str:
+    """Write the synthetic PDFs; return the extractor version they are benchmarked with."""
+    from benchmarks import synthetic
+
+    synthetic.write_pdfs(
+        Path(work) / "pdfs",
+        config["docs"],
+        config["pages"],
+        config["columns"],
+        config["images"],
+        config["scanned"],
+        config["seed"],
+        config.get("captions", 0.0),
+    )
+    return importlib.import_module("1-extract_text").EXTRACTOR_VERSION
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> int:
+    """Print throughput changes against ``baseline``; return the number of regressions."""
+    regressions = 0
+    for stage, metrics in results["stages"].items():
+        for key, value in metrics.items():
+            before = baseline.get("stages", {}).get(stage, {}).get(key)
+            if not key.endswith("_per_sec") or not before:
+                continue
+            change = value / before - 1
+            flag = "❌" if change < -tolerance else "  "
+            regressions += change < -tolerance
+            print(f"{flag} {stage:<13} {key:<18} {before:>10} -> {value:>10} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every ETL stage.")
+    parser.add_argument("--docs", type=int, default=2, help="Synthetic documents")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per document")
+    parser.add_argument("--columns", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--images", type=int, default=0, help="Embedded images per page")
+    parser.add_argument("--scanned", type=float, default=0.0, help="Share of scanned pages")
+    parser.add_argument(
+        "--captions", type=float, default=0.0, help="Share of images with a figure caption"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1, help="Extraction worker processes")
+    parser.add_argument(
+        "--stages",
+        type=str,
+        default=",".join(DEFAULT_STAGES),
+        help=f"Comma-separated stages ({', '.join(STAGES)}; images, and extract "
+        "with --scanned, need tesseract)",
+    )
+    parser.add_argument("--output", type=str, default=None, help="Path for JSON results")
+    parser.add_argument("--compare", type=str, default=None, help="Earlier results JSON")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.2, help="Allowed throughput drop for --compare"
+    )
+    args = parser.parse_args()
+
+    stages = [s for s in STAGES if s in args.stages.split(",")]
+    config = {
+        k: getattr(args, k)
+        for k in ("docs", "pages", "columns", "images", "scanned", "captions", "seed", "workers")
+    }
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        # Compare like with like: reuse the baseline corpus settings.
+        config.update(baseline.get("config", {}))
+
+    results = {
+        "created_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "extractor_version": None,
+        "config": config,
+        "stages": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        work = Path(tmp)
+        # The corpus is built in its own process too: the parent stays small,
+        # since stage processes start from its memory footprint.
+        results["extractor_version"] = in_fresh_process(_prepare_corpus, str(work), config)
+        for name in stages:
+            results["stages"][name] = run_stage(name, work, config)
+            print(f"{name:<13} {json.dumps(results['stages'][name])}")
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    if args.compare and compare(results, baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+synthetic.py
+============
+
+Offline generator of synthetic medical documents for benchmarks.
+
+Produces PDFs (via PyMuPDF) with a chosen number of pages, one or two text
+columns, embedded images (a share of them with a "Figure N: ..." caption
+underneath) and a share of scanned (image-only) pages, and
+stage-1 style page records (JSONL) for benchmarking the later stages without
+any PDFs. Everything is seeded, so the same arguments give the same corpus::
+
+    python -m benchmarks.synthetic pdfs --output /tmp/corpus --docs 2 --pages 50 --columns 2
+    python -m benchmarks.synthetic pages --output /tmp/pages.jsonl --docs 10 --pages 200
+"""
+
+import argparse
+import random
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import fitz  # PyMuPDF
+
+from records import write_record
+
+
+DISEASES = [
+    "Cholera", "Hepatitis A", "Typhoid fever", "Malaria", "Tuberculosis",
+    "Type 2 diabetes", "Hypertension", "Pneumonia", "Dengue fever", "Measles",
+]
+SYMPTOMS = [
+    "watery diarrhoea", "fever", "vomiting", "muscle cramps", "jaundice",
+    "fatigue", "cough", "headache", "abdominal pain", "rash",
+]
+DRUGS = ["doxycycline", "azithromycin", "ciprofloxacin", "metformin", "amoxicillin"]
+FIGURES = ["Chest X-ray", "Incidence chart", "Stool micrograph", "Ward photo", "Case map"]
+FILLER = (
+    "patient clinic village water report history examination therapy infection "
+    "chronic acute severe mild laboratory stool blood pressure kidney liver "
+    "hospital ward nurse follow-up outcome recovery dehydration fluid saline"
+).split()
+
+# Rule-shaped sentences (see qa_rules.py) mixed with filler prose.
+TEMPLATES = [
+    "{disease} is an acute infection caused by contaminated food or water.",
+    "Symptoms of {disease} include {symptom} and {symptom2}.",
+    "{disease} is treated with oral rehydration and {drug}.",
+    "{disease} is caused by poor sanitation and unsafe water.",
+    "The recommended dose of {drug} is {dose} mg once daily.",
+    "{disease} is diagnosed by stool culture and rapid tests.",
+    "Risk factors for {disease} include travel and crowded housing.",
+    "Complications of {disease} include shock and kidney failure.",
+    "{disease} can be prevented by vaccination and safe water.",
+]
+
+
+def sentence(rng: random.Random, rule_rate: float = 0.3) -> str:
+    if rng.random() < rule_rate:
+        return rng.choice(TEMPLATES).format(
+            disease=rng.choice(DISEASES),
+            symptom=rng.choice(SYMPTOMS),
+            symptom2=rng.choice(SYMPTOMS),
+            drug=rng.choice(DRUGS),
+            dose=rng.choice([100, 250, 300, 500]),
+        )
+    words = rng.choices(FILLER, k=rng.randint(8, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def paragraph(rng: random.Random, n_sentences: int) -> str:
+    return " ".join(sentence(rng) for _ in range(n_sentences))
+
+
+def heading(rng: random.Random, doc_index: int, page_number: int) -> str:
+    if page_number % 10 == 1:
+        return f"Chapter {page_number // 10 + 1} {rng.choice(DISEASES)}"
+    return f"Section {page_number // 10 + 1}.{page_number % 10} {rng.choice(SYMPTOMS).title()}"
+
+
+def _noise_pixmap(rng: random.Random, width: int, height: int) -> fitz.Pixmap:
+    samples = bytes(rng.getrandbits(8) for _ in range(width * height * 3))
+    return fitz.Pixmap(fitz.csRGB, width, height, samples, 0)
+
+
+def write_pdf(
+    path: Path,
+    n_pages: int,
+    columns: int = 1,
+    images_per_page: int = 0,
+    scanned_share: float = 0.0,
+    seed: int = 0,
+    doc_index: int = 0,
+    captioned_share: float = 0.0,
+):
+    """Write one synthetic PDF; scanned pages are rasterised, image-only copies."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    width, height, margin = 595, 842, 50
+    n_figures = 0
+    for page_number in range(1, n_pages + 1):
+        page = doc.new_page(width=width, height=height)
+        page.insert_text(
+            (margin, margin + 16), heading(rng, doc_index, page_number),
+            fontname="hebo", fontsize=16,
+        )
+        top = margin + 40
+        if images_per_page:
+            image_height = 120
+            slot = (width - 2 * margin) / images_per_page
+            for i in range(images_per_page):
+                rect = fitz.Rect(
+                    margin + i * slot, top, margin + (i + 1) * slot - 10, top + image_height
+                )
+                page.insert_image(rect, pixmap=_noise_pixmap(rng, 64, 48))
+                if captioned_share and rng.random() < captioned_share:
+                    n_figures += 1
+                    page.insert_text(
+                        (rect.x0, rect.y1 + 12),
+                        f"Figure {n_figures}: {rng.choice(FIGURES)}",
+                        fontname="helv", fontsize=7,
+                    )
+            top += image_height + 20
+
+        gap = 20
+        column_width = (width - 2 * margin - gap * (columns - 1)) / columns
+        for c in range(columns):
+            x0 = margin + c * (column_width + gap)
+            rect = fitz.Rect(x0, top, x0 + column_width, height - margin)
+            page.insert_textbox(rect, paragraph(rng, 40 // columns), fontname="helv", fontsize=10)
+
+        if rng.random() < scanned_share:
+            pix = page.get_pixmap(dpi=100)
+            doc.delete_page(page.number)
+            page = doc.new_page(pno=page_number - 1, width=width, height=height)
+            page.insert_image(page.rect, pixmap=pix)
+    doc.save(path, deflate=True)
+    doc.close()
+
+
+def write_pdfs(
+    output_dir: Path,
+    n_docs: int,
+    n_pages: int,
+    columns: int = 1,
+    images_per_page: int = 0,
+    scanned_share: float = 0.0,
+    seed: int = 0,
+    captioned_share: float = 0.0,
+) -> List[Path]:
+    output_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for d in range(n_docs):
+        path = output_dir / f"synthetic_{d:03d}.pdf"
+        write_pdf(
+            path, n_pages, columns, images_per_page, scanned_share, seed + d, d, captioned_share
+        )
+        paths.append(path)
+    return paths
+
+
+def iter_page_records(n_docs: int, n_pages: int, seed: int = 0) -> Iterator[Dict]:
+    """Stage-1 style page records: cleaned text plus the heading side channel."""
+    rng = random.Random(seed)
+    processed_at = datetime.now().isoformat()
+    for d in range(n_docs):
+        for page_number in range(1, n_pages + 1):
+            title = heading(rng, d, page_number)
+            text = f"{title} {paragraph(rng, 40)}"
+            yield {
+                "filename": f"synthetic_{d:03d}.pdf",
+                "processed_at": processed_at,
+                "page": page_number,
+                "text": text,
+                "headings": [[0, len(title), 1.6, 1]],
+                "source": "vector",
+            }
+
+
+def write_page_records(path: Path, n_docs: int, n_pages: int, seed: int = 0) -> int:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    n_records = 0
+    with open(path, "w", encoding="utf-8") as f:
+        for record in iter_page_records(n_docs, n_pages, seed):
+            write_record(f, record)
+            n_records += 1
+    return n_records
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic medical corpus.")
+    parser.add_argument("kind", choices=["pdfs", "pages"], help="PDF files or page JSONL")
+    parser.add_argument("--output", type=str, required=True, help="Output folder or .jsonl path")
+    parser.add_argument("--docs", type=int, default=2, help="Number of documents")
+    parser.add_argument("--pages", type=int, default=50, help="Pages per document")
+    parser.add_argument("--columns", type=int, choices=[1, 2], default=1)
+    parser.add_argument("--images", type=int, default=0, help="Embedded images per page")
+    parser.add_argument(
+        "--scanned", type=float, default=0.0, help="Share of pages rendered as scans"
+    )
+    parser.add_argument(
+        "--captions", type=float, default=0.0, help="Share of images with a figure caption"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.kind == "pdfs":
+        paths = write_pdfs(
+            Path(args.output), args.docs, args.pages, args.columns,
+            args.images, args.scanned, args.seed, args.captions,
+        )
+        print(f"wrote {len(paths)} PDFs to {args.output}")
+    else:
+        n_records = write_page_records(Path(args.output), args.docs, args.pages, args.seed)
+        print(f"wrote {n_records} page records to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
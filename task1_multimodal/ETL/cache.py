@@ -0,0 +1,153 @@
+"""
+cache.py
+========
+
+Persistent incremental-extraction cache.
+
+Results are stored in a local SQLite file keyed by
+``(PDF content hash, namespace, extractor version, page)``. Pages are
+committed in batches of ``commit_every``, and a document is only marked
+complete once all of its pages are stored, so an interrupted run can reuse
+the pages it already finished (all but at most the last uncommitted batch).
+File hashes are themselves cached by ``(path, size, mtime)`` so an unchanged
+corpus is recognised without reading the PDFs again.
+"""
+
+import json
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from typing import Any, Iterator, Optional, Set
+
+
+HASH_CHUNK_SIZE = 1 << 20
+DEFAULT_COMMIT_EVERY = 50  # pages
+
+
+def sha256_file(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """SQLite-backed store of per-page extraction results."""
+
+    def __init__(self, db_path: Path, commit_every: int = DEFAULT_COMMIT_EVERY):
+        db_path = Path(db_path)
+        self.commit_every = max(1, commit_every)
+        self.n_uncommitted = 0
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                size INTEGER,
+                mtime_ns INTEGER,
+                doc_hash TEXT
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                doc_hash TEXT,
+                namespace TEXT,
+                version TEXT,
+                page INTEGER,
+                payload TEXT,
+                PRIMARY KEY (doc_hash, namespace, version, page)
+            );
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_hash TEXT,
+                namespace TEXT,
+                version TEXT,
+                n_pages INTEGER,
+                PRIMARY KEY (doc_hash, namespace, version)
+            );
+            """
+        )
+
+    def file_hash(self, path: Path) -> str:
+        """Content hash of ``path``, recomputed only when size or mtime change."""
+        key = str(Path(path).resolve())
+        stat = os.stat(path)
+        row = self.conn.execute(
+            "SELECT size, mtime_ns, doc_hash FROM files WHERE path = ?", (key,)
+        ).fetchone()
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+
+        doc_hash = sha256_file(path)
+        self.conn.execute(
+            "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)",
+            (key, stat.st_size, stat.st_mtime_ns, doc_hash),
+        )
+        self.conn.commit()
+        return doc_hash
+
+    def is_complete(self, doc_hash: str, namespace: str, version: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM documents WHERE doc_hash = ? AND namespace = ? AND version = ?",
+            (doc_hash, namespace, version),
+        ).fetchone()
+        return row is not None
+
+    def page_numbers(self, doc_hash: str, namespace: str, version: str) -> Set[int]:
+        rows = self.conn.execute(
+            "SELECT page FROM pages WHERE doc_hash = ? AND namespace = ? AND version = ?",
+            (doc_hash, namespace, version),
+        )
+        return {r[0] for r in rows}
+
+    def iter_pages(self, doc_hash: str, namespace: str, version: str) -> Iterator[Any]:
+        """Yield cached payloads of a document in page order."""
+        rows = self.conn.execute(
+            """
+            SELECT payload FROM pages
+            WHERE doc_hash = ? AND namespace = ? AND version = ?
+            ORDER BY page
+            """,
+            (doc_hash, namespace, version),
+        )
+        for (payload,) in rows:
+            yield json.loads(payload)
+
+    def get_page(
+        self, doc_hash: str, namespace: str, version: str, page: int
+    ) -> Optional[Any]:
+        row = self.conn.execute(
+            """
+            SELECT payload FROM pages
+            WHERE doc_hash = ? AND namespace = ? AND version = ? AND page = ?
+            """,
+            (doc_hash, namespace, version, page),
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_page(self, doc_hash: str, namespace: str, version: str, page: int, payload: Any):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?)",
+            (doc_hash, namespace, version, page, json.dumps(payload, ensure_ascii=False)),
+        )
+        self.n_uncommitted += 1
+        if self.n_uncommitted >= self.commit_every:
+            self.commit()
+
+    def mark_complete(self, doc_hash: str, namespace: str, version: str, n_pages: int):
+        """Record that every page of a document is cached and commit."""
+        self.conn.execute(
+            "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+            (doc_hash, namespace, version, n_pages),
+        )
+        self.commit()
+
+    def commit(self):
+        self.conn.commit()
+        self.n_uncommitted = 0
+
+    def close(self):
+        self.commit()
+        self.conn.close()
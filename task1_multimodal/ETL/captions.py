@@ -0,0 +1,156 @@
+"""
+captions.py
+===========
+
+Layout-aware image–caption alignment.
+
+Caption-like text blocks ("Figure 3: ...", "Fig. 2", "Table 1 –", ...) of a
+page are put in a uniform grid over the page. Each image placement
+(``page.get_image_rects``) is matched to the nearest caption block that is
+aligned with it (overlapping it horizontally, as captions above or below do,
+or vertically, as side captions do) by rectangle gap distance, searching the
+grid outwards ring by ring, within ``max_distance`` points. Diagonal blocks,
+such as the caption of a neighbouring panel, are ignored. Matched images take
+their caption from the vector text and need no OCR.
+"""
+
+import re
+from collections import defaultdict
+from itertools import groupby
+from operator import itemgetter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+import fitz  # PyMuPDF
+
+
+DEFAULT_CAPTION_DISTANCE = 72.0  # points (one inch)
+GRID_CELLS = 8  # per side of the page
+
+CAPTION_RE = re.compile(
+    r"^\s*(?:fig(?:ure)?s?|tables?|charts?|graphs?|plates?|diagrams?|images?|photos?|"
+    r"photographs?|illustrations?|schemes?|exhibits?)\.?\s*"
+    r"(?:\d+|[ivxlc]+\b|[a-z]\b)[\w.\-]*\s*[:.\-–—)]?",
+    re.IGNORECASE,
+)
+
+# First matching keyword in the caption decides ``image_type``.
+IMAGE_TYPES: List[Tuple[re.Pattern, str]] = [
+    (re.compile(r"\btables?\b", re.I), "table"),
+    (re.compile(r"\b(?:charts?|graphs?|plots?|histograms?|curves?|trends?)\b", re.I), "chart"),
+    (re.compile(r"\b(?:x-?rays?|radiographs?|ct|mri|ultrasound|scans?|ecg|ekg)\b", re.I), "scan"),
+    (re.compile(r"\b(?:micrographs?|microscopy|smears?|histology|stain(?:ed|ing)?)\b", re.I), "micrograph"),
+    (re.compile(r"\b(?:photos?|photographs?|pictures?)\b", re.I), "photo"),
+    (re.compile(r"\bmaps?\b", re.I), "map"),
+]
+
+Rect = Tuple[float, float, float, float]
+
+
+class Caption(NamedTuple):
+    rect: Rect
+    text: str
+
+
+def is_caption(text: str) -> bool:
+    return CAPTION_RE.match(text) is not None
+
+
+def image_type(caption: Optional[str]) -> str:
+    """Guess the kind of figure from its caption; ``"diagram"`` by default."""
+    if caption:
+        for pattern, kind in IMAGE_TYPES:
+            if pattern.search(caption):
+                return kind
+    return "diagram"
+
+
+def offsets(a: Rect, b: Rect) -> Tuple[float, float]:
+    """Horizontal and vertical gap between two rectangles (0 where they overlap)."""
+    return max(0.0, b[0] - a[2], a[0] - b[2]), max(0.0, b[1] - a[3], a[1] - b[3])
+
+
+def split_captions(words: Sequence[tuple]) -> List[Caption]:
+    """Caption blocks from the ``page.get_text("words")`` entries of one text block.
+
+    Blocks that do not start like a caption are ignored. Captions of panels
+    set side by side often end up in one block (even one line), so a block is
+    split again wherever another caption starts a line or follows a gap wider
+    than the line height.
+    """
+    texts = [w[4] for w in words]
+    if not texts or not is_caption(" ".join(texts[:4])):
+        return []
+    starts = [0]
+    for i in range(1, len(words)):
+        new_line = words[i][6] != words[i - 1][6]
+        wide_gap = words[i][0] - words[i - 1][2] > words[i][3] - words[i][1]
+        if (new_line or wide_gap) and is_caption(" ".join(texts[i : i + 4])):
+            starts.append(i)
+    captions = []
+    for start, end in zip(starts, starts[1:] + [len(words)]):
+        part = words[start:end]
+        rect = (
+            min(w[0] for w in part),
+            min(w[1] for w in part),
+            max(w[2] for w in part),
+            max(w[3] for w in part),
+        )
+        captions.append(Caption(rect, " ".join(texts[start:end])))
+    return captions
+
+
+class CaptionIndex:
+    """Uniform-grid spatial index over the caption blocks of one page."""
+
+    def __init__(self, captions: Sequence[Caption], page_rect: Rect, cells: int = GRID_CELLS):
+        self.captions = list(captions)
+        self.x0, self.y0 = page_rect[0], page_rect[1]
+        self.cell = max(page_rect[2] - page_rect[0], page_rect[3] - page_rect[1], 1.0) / cells
+        self.grid: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        for i, caption in enumerate(self.captions):
+            (cx0, cy0), (cx1, cy1) = self._cells(caption.rect)
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    self.grid[(cx, cy)].append(i)
+
+    @classmethod
+    def from_page(cls, page: "fitz.Page") -> "CaptionIndex":
+        captions = []
+        for _, words in groupby(page.get_text("words"), key=itemgetter(5)):
+            captions.extend(split_captions(list(words)))
+        return cls(captions, tuple(page.rect))
+
+    def _cells(self, rect: Rect) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+        return (
+            (int((rect[0] - self.x0) // self.cell), int((rect[1] - self.y0) // self.cell)),
+            (int((rect[2] - self.x0) // self.cell), int((rect[3] - self.y0) // self.cell)),
+        )
+
+    def nearest(self, rect: Rect, max_distance: float = DEFAULT_CAPTION_DISTANCE) -> Optional[Caption]:
+        """Nearest caption within ``max_distance``; on ties, one below the image wins."""
+        if not self.captions:
+            return None
+        (cx0, cy0), (cx1, cy1) = self._cells(rect)
+        best, best_key = None, None
+        seen = set()
+        for ring in range(int(max_distance // self.cell) + 2):
+            for cx in range(cx0 - ring, cx1 + ring + 1):
+                for cy in range(cy0 - ring, cy1 + ring + 1):
+                    if ring and cx0 - ring < cx < cx1 + ring and cy0 - ring < cy < cy1 + ring:
+                        continue  # inner cells were searched in earlier rings
+                    for i in self.grid.get((cx, cy), ()):
+                        if i in seen:
+                            continue
+                        seen.add(i)
+                        caption = self.captions[i]
+                        dx, dy = offsets(rect, caption.rect)
+                        if dx and dy:
+                            continue
+                        distance = dx + dy
+                        key = (distance, caption.rect[1] < rect[1], i)
+                        if distance <= max_distance and (best_key is None or key < best_key):
+                            best, best_key = caption, key
+            # Anything in a further ring is at least ``ring * cell`` away.
+            if best_key is not None and best_key[0] <= ring * self.cell:
+                break
+        return best
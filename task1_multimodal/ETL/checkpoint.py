@@ -0,0 +1,173 @@
+"""
+checkpoint.py
+=============
+
+Crash-safe, resumable output for the extraction stages.
+
+Results are appended to their output files as they finish. After each
+finished unit (a page) the outputs are flushed and one line is appended to a
+JSONL manifest with the unit and the byte size of every output file at that
+point. ``--resume`` truncates the outputs back to the last manifest line,
+dropping anything half written, and the stage skips the units already there.
+
+Documents that raise, or that use up their time budget (``DocumentTimer``),
+are recorded as quarantined and skipped on resume instead of stopping the
+batch.
+"""
+
+import json
+import logging
+import signal
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+
+logger = logging.getLogger("checkpoint")
+
+
+class DocumentTimeout(BaseException):
+    """A document used up its extraction time budget.
+
+    Derived from ``BaseException`` so the broad ``except Exception`` blocks in
+    PDF libraries do not swallow or re-wrap it.
+    """
+
+
+class DocumentTimer:
+    """Time budget for the extraction work on one document.
+
+    Only the code inside ``running()`` counts, so time spent downstream while a
+    generator is suspended is not charged to the document. Where SIGALRM is
+    available (Unix, main thread) a stuck parse is interrupted; elsewhere the
+    budget is checked after each block.
+    """
+
+    def __init__(self, seconds: Optional[float], name: str):
+        self.remaining = seconds
+        self.name = name
+
+    def _expired(self, signum=None, frame=None):
+        raise DocumentTimeout(f"{self.name}: extraction time budget exhausted")
+
+    @contextmanager
+    def running(self):
+        if self.remaining is None:
+            yield
+            return
+        if self.remaining <= 0:
+            self._expired()
+        use_alarm = hasattr(signal, "setitimer") and (
+            threading.current_thread() is threading.main_thread()
+        )
+        if use_alarm:
+            previous = signal.signal(signal.SIGALRM, self._expired)
+            signal.setitimer(signal.ITIMER_REAL, self.remaining)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            if use_alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+                signal.signal(signal.SIGALRM, previous)
+            self.remaining -= time.perf_counter() - started
+        if self.remaining <= 0:
+            self._expired()
+
+
+def _read_manifest(path: Path) -> List[Dict]:
+    """Manifest entries, ignoring a last line cut short by a crash."""
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.endswith("\n"):
+                break
+            entries.append(json.loads(line))
+    return entries
+
+
+class Checkpoint:
+    """Output files plus the manifest of committed units.
+
+    ``files`` are opened for appending (text, UTF-8) in the order of
+    ``outputs``; write results there and call ``commit`` once a unit is
+    complete.
+    """
+
+    def __init__(self, manifest_path: Path, outputs: List[Path], resume: bool = False):
+        self.manifest_path = Path(manifest_path)
+        self.done: Dict[str, Set[int]] = defaultdict(set)
+        self.quarantined: Dict[str, str] = {}
+        self.n_units = 0
+        self.last: Dict = {}
+
+        entries = []
+        if resume and self.manifest_path.exists():
+            entries = _read_manifest(self.manifest_path)
+        offsets = [0] * len(outputs)
+        for entry in entries:
+            if entry["status"] == "done":
+                self.done[entry["file"]].add(entry["page"])
+                self.n_units += 1
+                self.last = entry
+                offsets = entry["offsets"]
+            else:
+                self.quarantined[entry["file"]] = entry["reason"]
+
+        if entries:
+            missing = [p for p, o in zip(outputs, offsets) if o and not Path(p).exists()]
+            if missing:
+                raise FileNotFoundError(f"Cannot resume, output missing: {missing[0]}")
+            logger.info(
+                f"♻️ Resuming: {self.n_units} units done, "
+                f"{len(self.quarantined)} documents quarantined"
+            )
+        elif resume:
+            logger.info("♻️ Nothing to resume, starting from scratch")
+
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.manifest_path, "w", encoding="utf-8") as f:
+            for entry in entries:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        for path, offset in zip(outputs, offsets):
+            with open(path, "ab") as f:
+                f.truncate(offset)
+
+        self.files = [open(path, "a", encoding="utf-8") for path in outputs]
+        self.manifest = open(self.manifest_path, "a", encoding="utf-8")
+
+    @property
+    def last_file(self) -> Optional[str]:
+        return self.last.get("file")
+
+    def _append(self, entry: Dict):
+        self.manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self.manifest.flush()
+
+    def commit(self, filename: str, page: int, **state):
+        """Flush the outputs and record ``(filename, page)`` as done.
+
+        Extra ``state`` (e.g. a running record count) is stored with the entry
+        and available as ``last`` after resuming.
+        """
+        offsets = []
+        for f in self.files:
+            f.flush()
+            offsets.append(f.tell())
+        entry = {"status": "done", "file": filename, "page": page, "offsets": offsets, **state}
+        self._append(entry)
+        self.done[filename].add(page)
+        self.n_units += 1
+        self.last = entry
+
+    def quarantine(self, filename: str, reason: str):
+        self._append({"status": "quarantined", "file": filename, "reason": reason})
+        self.quarantined[filename] = reason
+
+    def close(self):
+        for f in self.files:
+            f.close()
+        self.manifest.close()
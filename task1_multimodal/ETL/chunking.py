@@ -0,0 +1,350 @@
+"""
+chunking.py
+===========
+
+Purpose:
+--------
+Split the annotated pages of stage 2 into overlapping, size-bounded chunks
+for retrieval-augmented generation.
+
+Each page is scanned once: its tokens are found with one regex pass, and
+sentence ends (``.``, ``!`` or ``?`` before whitespace, or a blank line) and
+headings (the stage 1 side channel) are read off the gaps between consecutive
+tokens. A chunk takes as many whole sentences as fit in ``max_tokens`` and
+never runs past a chapter or section heading; a sentence longer than that
+is cut at a token boundary. The next chunk starts at the first sentence
+within the last ``overlap`` tokens of the previous one. Only offsets are
+kept while scanning; the page text is sliced once per chunk, when it is
+written out.
+
+Each chunk record carries a content-derived ``chunk_id``, its
+``char_start``/``char_end`` offsets into the page ``text`` (Python string
+indices), its token count and the chapter/section/subsection in force where
+it starts. Chunks stream to ``extracted_text/chunks.jsonl`` and the
+``chunks`` table of ``qa_data.db``.
+
+Tokens are words and single punctuation marks, which tracks subword
+tokenizer counts closely enough for sizing; keep ``max_tokens`` a little
+below the embedding model's limit.
+
+Usage::
+
+    python chunking.py --chunk-tokens 256 --chunk-overlap 32
+"""
+
+import argparse
+import importlib
+import logging
+import re
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from metrics import METRICS, add_metrics_arguments, finish_metrics, start_metrics
+from records import iter_documents, iter_page_records, write_record
+from storage import DEFAULT_BATCH_SIZE, add_storage_arguments, connect, insert_many, stable_id
+
+
+# === Logging Setup ===
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("chunking")
+
+transform_load = importlib.import_module("2-transform_load")
+
+DEFAULT_MAX_TOKENS = 256
+DEFAULT_OVERLAP = 32
+# Headings up to this level (chapter, section) always start a new chunk;
+# subsection headings only count as sentence boundaries.
+HARD_BREAK_LEVEL = 2
+
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+SENTENCE_END = frozenset(".!?")
+SOFT, HARD = 1, 2
+
+CHUNK_COLUMNS = (
+    "chunk_id",
+    "filename",
+    "page",
+    "chunk_index",
+    "char_start",
+    "char_end",
+    "n_tokens",
+    "chapter",
+    "section",
+    "subsection",
+    "text",
+)
+
+
+def enter_heading(path: List[Optional[str]], level: int, title: str):
+    """A new heading replaces its level of ``path`` and clears the levels below."""
+    path[level - 1 :] = [title] + [None] * (3 - level)
+
+
+class ChunkSettings(NamedTuple):
+    """Chunks of at most ``max_tokens`` tokens, overlapping by up to ``overlap``
+    (capped at half a chunk)."""
+
+    max_tokens: int = DEFAULT_MAX_TOKENS
+    overlap: int = DEFAULT_OVERLAP
+
+
+def iter_page_chunks(
+    page: Dict[str, Any], path: List[Optional[str]], settings: ChunkSettings = ChunkSettings()
+) -> Iterator[Dict[str, Any]]:
+    """Yield the chunks of one page.
+
+    ``path`` is the chapter/section/subsection in force where the page
+    starts; it is updated in place with the page's headings, ready for the
+    next page of the document.
+    """
+    text = page.get("text") or ""
+    headings = sorted(transform_load.iter_heading_spans(page))
+
+    # One pass over the tokens: offsets, and the kind of boundary before each.
+    starts: List[int] = []
+    ends: List[int] = []
+    kinds = bytearray()
+    events = []  # (token index, level, title) of each heading
+    h = 0
+    prev_end = 0
+    for match in TOKEN_RE.finditer(text):
+        start = match.start()
+        kind = 0
+        if starts and start > prev_end and (
+            text[prev_end - 1] in SENTENCE_END or text.count("\n", prev_end, start) > 1
+        ):
+            kind = SOFT
+        while h < len(headings) and headings[h][0] < match.end():
+            _, level, title = headings[h]
+            events.append((len(starts), level, title))
+            kind = max(kind, HARD if level <= HARD_BREAK_LEVEL else SOFT)
+            h += 1
+        starts.append(start)
+        ends.append(match.end())
+        kinds.append(kind)
+        prev_end = match.end()
+
+    n = len(starts)
+    max_tokens = max(1, settings.max_tokens)
+    overlap = min(max(0, settings.overlap), max_tokens // 2)
+    filename, number = page.get("filename"), page.get("page")
+    e = 0
+    i = 0
+    done = 0  # token index the previous chunk ended at
+    index = 0
+    while i < n:
+        while e < len(events) and events[e][0] <= i:
+            enter_heading(path, *events[e][1:])
+            e += 1
+
+        # Longest run of whole sentences that fits, stopping at a hard break.
+        limit = min(i + max_tokens, n)
+        end = None
+        for j in range(i + 1, limit + 1):
+            if j == n or kinds[j]:
+                end = j
+                if j < n and kinds[j] == HARD:
+                    break
+        cut = end is None
+        if cut:
+            end = limit
+        if end <= done:
+            i = done  # the overlap would add nothing new: drop it
+            continue
+        done = end
+
+        char_start, char_end = starts[i], ends[end - 1]
+        chunk_text = text[char_start:char_end]
+        yield {
+            "chunk_id": stable_id("chunk", filename, number, char_start, chunk_text),
+            "filename": filename,
+            "page": number,
+            "chunk_index": index,
+            "char_start": char_start,
+            "char_end": char_end,
+            "n_tokens": end - i,
+            "chapter": path[0],
+            "section": path[1],
+            "subsection": path[2],
+            "text": chunk_text,
+        }
+        index += 1
+
+        if end == n:
+            break
+        if cut:
+            i = max(end - overlap, i + 1)
+        elif kinds[end] == HARD or not overlap:
+            i = end
+        else:
+            i = next((j for j in range(max(end - overlap, i + 1), end) if kinds[j]), end)
+
+    for _, level, title in events[e:]:
+        enter_heading(path, level, title)
+
+
+def iter_chunked_pages(
+    records: Iterable[Dict[str, Any]], settings: ChunkSettings = ChunkSettings()
+) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+    """Yield ``(page, chunks)`` for each page record, in order.
+
+    The heading path is carried across the pages of a document. Pages marked
+    as near-duplicates (``duplicate_of``) get no chunks.
+    """
+    for _, pages in iter_documents(records):
+        path: List[Optional[str]] = [None, None, None]
+        for page in pages:
+            document, number = page.get("filename"), page.get("page")
+            if page.get("duplicate_of"):
+                for _, level, title in sorted(transform_load.iter_heading_spans(page)):
+                    enter_heading(path, level, title)
+                chunks = []
+            else:
+                with METRICS.timer("chunk_seconds", "chunk", document, number):
+                    chunks = list(iter_page_chunks(page, path, settings))
+            METRICS.count("chunks", len(chunks), "chunk", document, number)
+            yield page, chunks
+
+
+def ensure_chunk_schema(conn: sqlite3.Connection):
+    conn.executescript(
+        """
+        CREATE TABLE IF NOT EXISTS chunks (
+            chunk_id TEXT PRIMARY KEY,
+            filename TEXT,
+            page INTEGER,
+            chunk_index INTEGER,
+            char_start INTEGER,
+            char_end INTEGER,
+            n_tokens INTEGER,
+            chapter TEXT,
+            section TEXT,
+            subsection TEXT,
+            text TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_chunks_filename_page ON chunks (filename, page);
+        """
+    )
+
+
+class ChunkWriter:
+    """Writes the chunks of page records to JSONL and (optionally) SQLite.
+
+    ``tee`` passes the page records downstream unchanged, so chunking can sit
+    in a streamed pipeline; the SQLite ``chunks`` table is replaced.
+    """
+
+    def __init__(
+        self,
+        jsonl_path: Path,
+        db_path: Optional[Path] = None,
+        settings: ChunkSettings = ChunkSettings(),
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        journal_mode: str = "WAL",
+        synchronous: str = "NORMAL",
+    ):
+        self.jsonl_path = Path(jsonl_path)
+        self.db_path = Path(db_path) if db_path is not None else None
+        self.settings = settings
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.n_pages = 0
+        self.n_chunks = 0
+
+    def tee(self, records: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        sql = f"INSERT OR REPLACE INTO chunks VALUES ({', '.join('?' for _ in CHUNK_COLUMNS)})"
+        conn = None
+        self.jsonl_path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            if self.db_path is not None:
+                self.db_path.parent.mkdir(parents=True, exist_ok=True)
+                conn = connect(self.db_path, self.journal_mode, self.synchronous)
+                ensure_chunk_schema(conn)
+                with conn:
+                    conn.execute("DELETE FROM chunks")
+            pending = []
+            with open(self.jsonl_path, "w", encoding="utf-8") as f:
+                for record, chunks in iter_chunked_pages(records, self.settings):
+                    for chunk in chunks:
+                        write_record(f, chunk)
+                    if conn is not None:
+                        pending.extend(tuple(c[k] for k in CHUNK_COLUMNS) for c in chunks)
+                        if len(pending) >= self.batch_size:
+                            with METRICS.timer("sqlite_seconds", "chunk", table="chunks"):
+                                insert_many(conn, sql, pending, self.batch_size)
+                            pending = []
+                    self.n_pages += 1
+                    self.n_chunks += len(chunks)
+                    yield record
+            if conn is not None:
+                with METRICS.timer("sqlite_seconds", "chunk", table="chunks"):
+                    insert_many(conn, sql, pending, self.batch_size)
+                METRICS.count("rows_written", self.n_chunks, "chunk", table="chunks")
+        finally:
+            if conn is not None:
+                conn.close()
+        logger.info(f"🧩 {self.n_chunks} chunks from {self.n_pages} pages saved to: {self.jsonl_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Split annotated pages into overlapping chunks for retrieval."
+    )
+    parser.add_argument(
+        "--input",
+        type=str,
+        default="outputs/extracted_text/extracted_data_cleaned.jsonl",
+        help="Annotated page records from stage 2 (JSONL, or legacy combined JSON)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="outputs/extracted_text/chunks.jsonl",
+        help="Path to save the chunk records (JSONL)",
+    )
+    parser.add_argument(
+        "--db", type=str, default="outputs/qa_data.db", help="SQLite database for the chunks table"
+    )
+    parser.add_argument(
+        "--no-db", action="store_true", help="Only write the JSONL file"
+    )
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=DEFAULT_MAX_TOKENS,
+        help="Maximum tokens (words and punctuation marks) per chunk",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=DEFAULT_OVERLAP,
+        help="Tokens a chunk may share with the previous one, rounded to whole sentences",
+    )
+    add_storage_arguments(parser)
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    start_metrics(args)
+
+    writer = ChunkWriter(
+        Path(args.output),
+        None if args.no_db else Path(args.db),
+        ChunkSettings(args.chunk_tokens, args.chunk_overlap),
+        args.batch_size,
+        args.journal_mode,
+        args.synchronous,
+    )
+    for _ in writer.tee(iter_page_records(Path(args.input))):
+        pass
+
+    finish_metrics(args)
+    logger.info("Chunking completed successfully ✅")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+dedup.py
+========
+
+MinHash/LSH near-duplicate detection for page records and Q&A pairs.
+
+Texts are reduced to word k-gram shingles, hashed into a fixed-size MinHash
+signature with NumPy (one vectorised pass per text), and bucketed by LSH
+bands. A new text is only compared with the kept texts sharing one of its
+band buckets, so checking a stream of ``n`` texts stays close to linear
+instead of the ``n²`` of pairwise comparison. The first occurrence is always
+kept; later near-duplicates can be marked (``duplicate_of``) or dropped.
+"""
+
+import logging
+import re
+import zlib
+from collections import defaultdict
+from typing import Callable, Dict, Hashable, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from metrics import METRICS
+
+
+logger = logging.getLogger("dedup")
+
+DEDUP_MODES = ["off", "mark", "drop"]
+WORD_RE = re.compile(r"\w+")
+
+MAX_HASH = np.uint64((1 << 32) - 1)
+SHINGLE_BASE = np.uint64(1_000_003)
+
+
+def shingle_hashes(text: str, k: int) -> np.ndarray:
+    """32-bit hashes of the lower-cased word k-grams of ``text``."""
+    tokens = WORD_RE.findall(text.lower())
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    h = np.fromiter(
+        (zlib.crc32(t.encode("utf-8")) for t in tokens), dtype=np.uint64, count=len(tokens)
+    )
+    k = min(k, len(h))
+    n = len(h) - k + 1
+    # Polynomial rolling combination of each window, with uint64 wrap-around.
+    combined = np.zeros(n, dtype=np.uint64)
+    for j in range(k):
+        combined = combined * SHINGLE_BASE + h[j : j + n]
+    return np.unique((combined ^ (combined >> np.uint64(32))) & MAX_HASH)
+
+
+class NearDuplicateIndex:
+    """Streaming MinHash/LSH index answering "is this a near-duplicate of a kept text?".
+
+    ``threshold`` is the estimated Jaccard similarity at which two texts count
+    as duplicates; ``bands * rows`` is the signature length.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.8,
+        shingle_size: int = 5,
+        bands: int = 16,
+        rows: int = 8,
+        seed: int = 1,
+    ):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self.bands = bands
+        self.rows = rows
+        rng = np.random.default_rng(seed)
+        num_perm = bands * rows
+        # Multiply-shift hash family: odd 64-bit multipliers, top 32 bits kept.
+        a = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64) | np.uint64(1)
+        b = rng.integers(0, 1 << 64, size=num_perm, dtype=np.uint64)
+        self.a, self.b = a[:, None], b[:, None]
+        self.buckets: Dict[bytes, List[int]] = defaultdict(list)
+        self.keys: List[Hashable] = []
+        self.signatures: List[np.ndarray] = []
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        shingles = shingle_hashes(text, self.shingle_size)
+        if not len(shingles):
+            return None
+        hashed = (self.a * shingles[None, :] + self.b) >> np.uint64(32)
+        return hashed.min(axis=1)
+
+    def check(self, key: Hashable, text: str) -> Optional[Hashable]:
+        """Return the key of a kept near-duplicate of ``text``, else keep it and return None."""
+        return self.check_signature(key, self.signature(text))
+
+    def check_signature(self, key: Hashable, sig: Optional[np.ndarray]) -> Optional[Hashable]:
+        """``check`` for a signature computed earlier, e.g. in a worker process."""
+        if sig is None:
+            return None
+        band_keys = [
+            i.to_bytes(2, "little") + band.tobytes()
+            for i, band in enumerate(sig.reshape(self.bands, self.rows))
+        ]
+        seen = set()
+        for band_key in band_keys:
+            for j in self.buckets.get(band_key, ()):
+                if j in seen:
+                    continue
+                seen.add(j)
+                if np.count_nonzero(self.signatures[j] == sig) >= self.threshold * len(sig):
+                    return self.keys[j]
+
+        position = len(self.keys)
+        self.keys.append(key)
+        self.signatures.append(sig)
+        for band_key in band_keys:
+            self.buckets[band_key].append(position)
+        return None
+
+
+class DedupStats:
+    """Per-document counts of items seen and near-duplicates found."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.totals: Dict[str, int] = defaultdict(int)
+        self.duplicates: Dict[str, int] = defaultdict(int)
+
+    def add(self, doc: str, duplicate: bool):
+        self.totals[doc] += 1
+        if duplicate:
+            self.duplicates[doc] += 1
+            METRICS.count("near_duplicates", 1, "dedup", doc, kind=self.kind)
+
+    def ratios(self) -> Dict[str, float]:
+        return {doc: self.duplicates[doc] / n for doc, n in self.totals.items()}
+
+    def log(self):
+        for doc, ratio in self.ratios().items():
+            logger.info(
+                f"🧹 {doc}: {self.duplicates[doc]}/{self.totals[doc]} {self.kind} "
+                f"near-duplicate ({ratio:.1%})"
+            )
+
+
+def dedup_records(
+    records: Iterable[Dict],
+    index: NearDuplicateIndex,
+    key: Callable[[Dict], Hashable],
+    text: Callable[[Dict], str],
+    doc: Callable[[Dict], str],
+    mode: str = "mark",
+    stats: Optional[DedupStats] = None,
+    signatures: Optional[Iterable[Optional[np.ndarray]]] = None,
+) -> Iterator[Dict]:
+    """Mark (``duplicate_of``) or drop near-duplicate records while streaming them.
+
+    ``signatures``, if given, are the records' precomputed ``index.signature``s
+    in the same order.
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    signatures = iter(signatures) if signatures is not None else None
+    for record in records:
+        if mode == "off":
+            yield record
+            continue
+        if signatures is not None:
+            original = index.check_signature(key(record), next(signatures))
+        else:
+            original = index.check(key(record), text(record))
+        if stats is not None:
+            stats.add(doc(record), original is not None)
+        if mode == "mark":
+            record["duplicate_of"] = original
+            yield record
+        elif original is None:
+            yield record
+
+
+def page_key(page: Dict) -> str:
+    return f"{page.get('filename')}:p{page.get('page')}"
+
+
+def dedup_pages(
+    pages: Iterable[Dict],
+    mode: str = "mark",
+    threshold: float = 0.8,
+    stats: Optional[DedupStats] = None,
+) -> Iterator[Dict]:
+    """Near-duplicate pages (boilerplate repeated within or across PDFs)."""
+    return dedup_records(
+        pages,
+        NearDuplicateIndex(threshold, shingle_size=5),
+        key=page_key,
+        text=lambda p: p.get("text", ""),
+        doc=lambda p: p.get("filename", "unknown.pdf"),
+        mode=mode,
+        stats=stats,
+    )
+
+
+def qa_index(threshold: float = 0.8) -> NearDuplicateIndex:
+    """Index for Q&A pairs: short texts, so shorter shingles."""
+    return NearDuplicateIndex(threshold, shingle_size=3)
+
+
+def qa_text(qa: Dict) -> str:
+    """The text Q&A pairs are compared on: question and answer together."""
+    return f"{qa['question']} {qa['answer']}"
+
+
+def dedup_qa_pairs(
+    qa_pairs: Iterable[Dict],
+    index: NearDuplicateIndex,
+    mode: str = "drop",
+    stats: Optional[DedupStats] = None,
+    signatures: Optional[Iterable[Optional[np.ndarray]]] = None,
+) -> Iterator[Dict]:
+    """Near-duplicate Q&A pairs, compared on question and answer together."""
+    return dedup_records(
+        qa_pairs,
+        index,
+        key=lambda qa: qa["id"],
+        text=qa_text,
+        doc=lambda qa: qa["source_document"],
+        mode=mode,
+        stats=stats,
+        signatures=signatures,
+    )
@@ -0,0 +1,381 @@
+"""
+etl.py
+======
+
+Purpose:
+--------
+Run the ETL stages in a single process.
+
+Page records are handed from stage to stage through generators instead of
+being serialised and re-parsed between interpreters; every stage still writes
+its usual on-disk artifact, so any subset of stages can be run and later
+stages pick up the earlier artifacts from disk.
+"""
+
+import argparse
+import importlib
+import logging
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Optional
+
+from cache import ExtractionCache
+from chunking import ChunkSettings, ChunkWriter
+from dedup import DedupStats, dedup_pages
+from export_parquet import export_tables
+from metrics import METRICS, add_metrics_arguments, finish_metrics, start_metrics
+from memory import DEFAULT_PAGE_WINDOW, MemorySettings
+from ocr import OcrSettings
+from records import iter_page_records, tee_jsonl
+from search_index import index_pages
+
+
+# === Logging Setup ===
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("etl")
+
+STAGES = ["extract", "images", "transform", "chunk", "qa", "conversations", "export"]
+
+extract_text = importlib.import_module("1-extract_text")
+transform_load = importlib.import_module("2-transform_load")
+generate_qa_pairs = importlib.import_module("3-generate_qa_pairs")
+create_conversations = importlib.import_module("4-create_conversations")
+
+
+class StageStats:
+    """Own wall time and record count for one stage.
+
+    Streamed stages do their work while records are pulled through them, so
+    that time includes their upstream stages; the upstream's share is
+    subtracted to report each stage's own time.
+    """
+
+    def __init__(self, name: str, upstream: Optional["StageStats"] = None):
+        self.name = name
+        self.upstream = upstream
+        self.seconds = 0.0
+        self.total = 0.0
+        self.records = 0
+
+    def _upstream_total(self) -> float:
+        return self.upstream.total if self.upstream is not None else 0.0
+
+    def _add(self, started: float, upstream_before: float):
+        elapsed = time.perf_counter() - started
+        self.total += elapsed
+        self.seconds += elapsed - (self._upstream_total() - upstream_before)
+
+    def wrap(self, records: Iterable[Dict]) -> Iterator[Dict]:
+        """Time a streamed stage and count the records it yields."""
+        iterator = iter(records)
+        while True:
+            upstream_before, started = self._upstream_total(), time.perf_counter()
+            try:
+                record = next(iterator)
+            except StopIteration:
+                self._add(started, upstream_before)
+                return
+            self._add(started, upstream_before)
+            self.records += 1
+            yield record
+
+    @contextmanager
+    def timer(self):
+        """Time a stage that consumes its input itself."""
+        upstream_before, started = self._upstream_total(), time.perf_counter()
+        try:
+            yield self
+        finally:
+            self._add(started, upstream_before)
+
+
+def drain(records: Iterable) -> None:
+    deque(records, maxlen=0)
+
+
+def run(
+    stages: Iterable[str],
+    input_dir: Path,
+    output_dir: Path,
+    workers: int = 1,
+    pages_per_task: int = 50,
+    max_qas: int = 100,
+    per_doc: Optional[int] = None,
+    num_conversations: int = 10,
+    seed: Optional[int] = None,
+    use_cache: bool = True,
+    medical: bool = False,
+    ocr: Optional[OcrSettings] = OcrSettings(),
+    memory: MemorySettings = MemorySettings(),
+    resume: bool = False,
+    timeout: Optional[float] = None,
+    chunking: ChunkSettings = ChunkSettings(),
+) -> Dict[str, StageStats]:
+    """Run the selected stages in pipeline order and return their stats.
+
+    With ``resume`` the extraction stages continue from their checkpoints;
+    text extraction then finishes before the later stages read its full
+    output from disk.
+    """
+    stages = [s for s in STAGES if s in set(stages)]
+    text_dir = output_dir / "extracted_text"
+    text_dir.mkdir(parents=True, exist_ok=True)
+    extracted_path = text_dir / "all_extracted_data.jsonl"
+    cleaned_path = text_dir / "extracted_data_cleaned.jsonl"
+    db_path = output_dir / "qa_data.db"
+
+    cache = ExtractionCache(output_dir / "cache" / "extraction_cache.db") if use_cache else None
+    pdf_files = list(input_dir.glob("*.pdf"))
+    stats: Dict[str, StageStats] = {}
+    page_dedup = DedupStats("pages")
+    pages = None
+    upstream = None
+    checkpoint = None
+    chunks = None
+
+    try:
+        if "extract" in stages:
+            checkpoint = extract_text.open_checkpoint(text_dir, resume)
+            stats["extract"] = upstream = StageStats("extract")
+            pages = stats["extract"].wrap(
+                extract_text.write_outputs(
+                    extract_text.iter_extracted_pages(
+                        pdf_files,
+                        workers,
+                        pages_per_task,
+                        cache=cache,
+                        medical=medical,
+                        ocr=ocr,
+                        memory=memory,
+                        checkpoint=checkpoint,
+                        timeout=timeout,
+                    ),
+                    text_dir,
+                    checkpoint,
+                )
+            )
+            if resume:
+                # Only new pages flow through the generators; later stages need all of them.
+                drain(pages)
+                pages = None
+
+        if "images" in stages:
+            from extract_image import extract_images
+
+            stats["images"] = StageStats("images")
+            with stats["images"].timer():
+                stats["images"].records = extract_images(
+                    input_dir,
+                    output_dir / "images",
+                    output_dir / "image_text_pairs.json",
+                    cache=cache,
+                    resume=resume,
+                    timeout=timeout,
+                )
+
+        if "transform" in stages:
+            source = pages if pages is not None else iter_page_records(extracted_path)
+            stats["transform"] = upstream = StageStats("transform", upstream)
+            pages = stats["transform"].wrap(
+                index_pages(
+                    tee_jsonl(
+                        dedup_pages(
+                            transform_load.annotate_pages(source), stats=page_dedup
+                        ),
+                        cleaned_path,
+                    ),
+                    db_path,
+                )
+            )
+        elif pages is not None:
+            drain(pages)
+            pages = None
+
+        if "chunk" in stages:
+            source = pages if pages is not None else iter_page_records(cleaned_path)
+            chunks = ChunkWriter(text_dir / "chunks.jsonl", db_path, chunking)
+            stats["chunk"] = upstream = StageStats("chunk", upstream)
+            pages = stats["chunk"].wrap(chunks.tee(source))
+
+        qa_pairs = None
+        if "qa" in stages:
+            source = iter(pages if pages is not None else iter_page_records(cleaned_path))
+            stats["qa"] = StageStats("qa", upstream)
+            with stats["qa"].timer():
+                qa_pairs = generate_qa_pairs.generate_qa_pairs(
+                    source, max_qas, per_doc=per_doc, workers=workers
+                )
+                generate_qa_pairs.save_to_sqlite(db_path, qa_pairs)
+            stats["qa"].records = len(qa_pairs)
+            drain(source)
+        elif pages is not None:
+            drain(pages)
+
+        if "conversations" in stages:
+            stats["conversations"] = StageStats("conversations")
+            with stats["conversations"].timer():
+                if qa_pairs is None:
+                    qa_pairs = create_conversations.load_qa_pairs_from_db(db_path)
+                conversations = create_conversations.iter_conversations(
+                    qa_pairs, num_conversations=num_conversations, seed=seed
+                )
+                stats["conversations"].records = (
+                    create_conversations.save_conversations_to_db(db_path, conversations)
+                )
+
+        if "export" in stages:
+            stats["export"] = StageStats("export")
+            with stats["export"].timer():
+                stats["export"].records = sum(
+                    export_tables(output_dir, output_dir / "parquet").values()
+                )
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        if cache is not None:
+            cache.close()
+
+    if chunks is not None:
+        stats["chunk"].records = chunks.n_chunks
+    page_dedup.log()
+    for name, stage in stats.items():
+        METRICS.observe("stage_seconds", stage.seconds, name)
+        logger.info(f"⏱️ {name:<13} {stage.seconds:8.2f}s  {stage.records:>8} records")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Run the multimodal ETL pipeline in a single process."
+    )
+    parser.add_argument(
+        "--stages",
+        type=str,
+        default=",".join(STAGES),
+        help=f"Comma-separated subset of stages to run ({', '.join(STAGES)})",
+    )
+    parser.add_argument(
+        "--input", type=str, default="../pdfs", help="Input folder containing PDFs"
+    )
+    parser.add_argument(
+        "--output", type=str, default="outputs", help="Output folder for all artifacts"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes for text extraction and Q&A"
+    )
+    parser.add_argument(
+        "--pages-per-task",
+        type=int,
+        default=50,
+        help="Page range size used to split large PDFs across workers",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=100,
+        help="Maximum number of Q&A pairs to generate, shared fairly across documents",
+    )
+    parser.add_argument(
+        "--per-doc-limit",
+        type=int,
+        default=None,
+        help="Maximum number of Q&A pairs per document",
+    )
+    parser.add_argument(
+        "--num_conversations",
+        type=int,
+        default=10,
+        help="Number of conversations to generate",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=None, help="Random seed for conversation sampling"
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore and do not update the cache"
+    )
+    parser.add_argument(
+        "--medical-normalize",
+        action="store_true",
+        help="Also normalise ligatures, unicode dashes and units in page text",
+    )
+    parser.add_argument(
+        "--no-ocr", action="store_true", help="Never OCR pages with sparse vector text"
+    )
+    parser.add_argument(
+        "--ocr-dpi", type=int, default=300, help="Render resolution for page OCR"
+    )
+    parser.add_argument(
+        "--page-window",
+        type=int,
+        default=DEFAULT_PAGE_WINDOW,
+        help="Reopen each PDF every N pages during text extraction (0 = never)",
+    )
+    parser.add_argument(
+        "--max-rss-mb",
+        type=float,
+        default=None,
+        help="Resident memory ceiling for text extraction (see memory.py)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue interrupted text/image extraction from their checkpoints",
+    )
+    parser.add_argument(
+        "--doc-timeout",
+        type=float,
+        default=None,
+        help="Quarantine a PDF after this many seconds of extraction",
+    )
+    parser.add_argument(
+        "--chunk-tokens",
+        type=int,
+        default=ChunkSettings().max_tokens,
+        help="Maximum tokens per retrieval chunk (see chunking.py)",
+    )
+    parser.add_argument(
+        "--chunk-overlap",
+        type=int,
+        default=ChunkSettings().overlap,
+        help="Tokens a chunk may share with the previous one",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(sorted(unknown))}")
+
+    start_metrics(args)
+    logger.info(f"🚀 Running stages: {', '.join(s for s in STAGES if s in stages)}")
+    run(
+        stages,
+        Path(args.input),
+        Path(args.output),
+        workers=args.workers,
+        pages_per_task=args.pages_per_task,
+        max_qas=args.limit,
+        per_doc=args.per_doc_limit,
+        num_conversations=args.num_conversations,
+        seed=args.seed,
+        use_cache=not args.no_cache,
+        medical=args.medical_normalize,
+        ocr=None if args.no_ocr else OcrSettings(dpi=args.ocr_dpi),
+        memory=MemorySettings(args.page_window, args.max_rss_mb),
+        resume=args.resume,
+        timeout=args.doc_timeout,
+        chunking=ChunkSettings(args.chunk_tokens, args.chunk_overlap),
+    )
+    finish_metrics(args)
+    logger.info("✅ ETL pipeline finished successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,373 @@
+"""
+export_parquet.py
+=================
+
+Purpose:
+--------
+Columnar export of the ETL outputs for pandas / warehouse loaders and
+fine-tuning dataloaders, instead of re-parsing indented JSON or the
+conversation blobs in SQLite.
+
+One file per table, each with a fixed schema (below), written in row groups
+of ``row_group_size`` rows while streaming, so memory stays flat:
+
+- ``pages``: cleaned page records (``extracted_data_cleaned.jsonl``)
+- ``chunks``: retrieval chunks (``chunks.jsonl``, see chunking.py)
+- ``qa_pairs``: the ``qa_pairs`` SQLite table
+- ``conversation_turns``: one row per turn of each stored conversation
+- ``image_pairs``: ``image_text_pairs.json``, parsed one pair at a time
+
+Read only the columns you need, memory-mapped::
+
+    pyarrow.parquet.read_table("outputs/parquet/qa_pairs.parquet",
+                               columns=["question", "answer"], memory_map=True)
+
+``--format arrow`` writes Arrow IPC files instead, which
+``pyarrow.ipc.open_file(pyarrow.memory_map(path))`` maps without copying.
+
+Usage::
+
+    python export_parquet.py --output outputs --tables pages,qa_pairs
+"""
+
+import argparse
+import json
+import logging
+import sqlite3
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from metrics import METRICS, add_metrics_arguments, finish_metrics, start_metrics
+from records import iter_json_array, iter_page_records
+from storage import QA_COLUMNS
+
+
+# === Logging Setup ===
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("export_parquet")
+
+DEFAULT_ROW_GROUP_SIZE = 65_536
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+
+HEADING_TYPE = pa.struct(
+    [
+        ("offset", pa.int32()),
+        ("length", pa.int32()),
+        ("scale", pa.float32()),
+        ("bold", pa.bool_()),
+    ]
+)
+
+PAGE_SCHEMA = pa.schema(
+    [
+        ("filename", pa.string()),
+        ("page", pa.int32()),
+        ("processed_at", pa.string()),
+        ("source", pa.string()),
+        ("chapter", pa.string()),
+        ("section", pa.string()),
+        ("subsection", pa.string()),
+        ("duplicate_of", pa.string()),
+        ("text", pa.string()),
+        ("headings", pa.list_(HEADING_TYPE)),
+    ]
+)
+
+CHUNK_SCHEMA = pa.schema(
+    [
+        ("chunk_id", pa.string()),
+        ("filename", pa.string()),
+        ("page", pa.int32()),
+        ("chunk_index", pa.int32()),
+        ("char_start", pa.int32()),
+        ("char_end", pa.int32()),
+        ("n_tokens", pa.int32()),
+        ("chapter", pa.string()),
+        ("section", pa.string()),
+        ("subsection", pa.string()),
+        ("text", pa.string()),
+    ]
+)
+
+QA_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("question", pa.string()),
+        ("answer", pa.string()),
+        ("source_document", pa.string()),
+        ("page_number", pa.int32()),
+        ("created_at", pa.string()),
+        ("category", pa.string()),
+    ]
+)
+
+TURN_SCHEMA = pa.schema(
+    [
+        ("conversation_id", pa.string()),
+        ("topic", pa.string()),
+        ("created_at", pa.string()),
+        ("turn_id", pa.int32()),
+        ("speaker", pa.string()),
+        ("text", pa.string()),
+        ("source_reference", pa.string()),
+    ]
+)
+
+IMAGE_SCHEMA = pa.schema(
+    [
+        ("pair_id", pa.string()),
+        ("image_path", pa.string()),
+        ("image_type", pa.string()),
+        ("caption_short", pa.string()),
+        ("caption_detailed", pa.string()),
+        ("caption_source", pa.string()),
+        ("bbox", pa.list_(pa.float64(), 4)),
+        ("image_hash", pa.string()),
+        ("thumbnail_path", pa.string()),
+        ("source_document", pa.string()),
+        ("page_number", pa.int32()),
+    ]
+)
+
+
+def iter_page_rows(path: Path) -> Iterator[Dict]:
+    for record in iter_page_records(path):
+        headings = record.get("headings") or []
+        yield {
+            **record,
+            "headings": [
+                {"offset": o, "length": n, "scale": s, "bold": bool(b)}
+                for o, n, s, b in headings
+            ],
+        }
+
+
+def iter_qa_rows(db_path: Path) -> Iterator[Dict]:
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(f"SELECT {', '.join(QA_COLUMNS)} FROM qa_pairs ORDER BY rowid")
+        for row in cursor:
+            yield dict(zip(QA_COLUMNS, row))
+    finally:
+        conn.close()
+
+
+def iter_turn_rows(db_path: Path) -> Iterator[Dict]:
+    """Flatten the JSON ``content`` of each stored conversation into its turns."""
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.execute(
+            "SELECT conversation_id, topic, created_at, content FROM conversations ORDER BY rowid"
+        )
+        for conversation_id, topic, created_at, content in cursor:
+            for turn in json.loads(content).get("turns", []):
+                yield {
+                    "conversation_id": conversation_id,
+                    "topic": topic,
+                    "created_at": created_at,
+                    **turn,
+                }
+    finally:
+        conn.close()
+
+
+def iter_image_rows(json_path: Path) -> Iterator[Dict]:
+    return iter_json_array(json_path, "image_text_pairs")
+
+
+def _has_table(db_path: Path, table: str) -> bool:
+    if not db_path.exists():
+        return False
+    conn = sqlite3.connect(db_path)
+    try:
+        return (
+            conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+            ).fetchone()
+            is not None
+        )
+    finally:
+        conn.close()
+
+
+def write_table(
+    rows: Iterable[Dict],
+    schema: pa.Schema,
+    path: Path,
+    fmt: str = "parquet",
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    compression: str = "zstd",
+) -> int:
+    """Stream ``rows`` into a Parquet (or Arrow IPC) file, one row group per batch.
+
+    Keys missing from a row become nulls and keys not in ``schema`` are
+    ignored. The file is written next to ``path`` and moved into place when
+    complete, so readers never map a half-written file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(tmp_path, schema, compression=compression)
+    else:
+        writer = pa.ipc.new_file(str(tmp_path), schema)
+    n_rows = 0
+    batch: List[Dict] = []
+
+    def flush():
+        writer.write_batch(pa.RecordBatch.from_pylist(batch, schema=schema))
+        batch.clear()
+
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= row_group_size:
+                flush()
+            n_rows += 1
+        if batch or not n_rows:
+            flush()
+    finally:
+        writer.close()
+    tmp_path.replace(path)
+    return n_rows
+
+
+class Table(NamedTuple):
+    """An exported table: its schema, input (relative to the ETL output folder),
+    row reader and a check that the input is there."""
+
+    schema: pa.Schema
+    source: Path
+    rows: Callable[[Path], Iterator[Dict]]
+    available: Callable[[Path], bool]
+
+
+TABLES: Dict[str, Table] = {
+    "pages": Table(
+        PAGE_SCHEMA,
+        Path("extracted_text/extracted_data_cleaned.jsonl"),
+        iter_page_rows,
+        lambda p: p.exists(),
+    ),
+    "chunks": Table(
+        CHUNK_SCHEMA,
+        Path("extracted_text/chunks.jsonl"),
+        iter_page_records,
+        lambda p: p.exists(),
+    ),
+    "qa_pairs": Table(
+        QA_SCHEMA,
+        Path("qa_data.db"),
+        iter_qa_rows,
+        lambda p: _has_table(p, "qa_pairs"),
+    ),
+    "conversation_turns": Table(
+        TURN_SCHEMA,
+        Path("qa_data.db"),
+        iter_turn_rows,
+        lambda p: _has_table(p, "conversations"),
+    ),
+    "image_pairs": Table(
+        IMAGE_SCHEMA,
+        Path("image_text_pairs.json"),
+        iter_image_rows,
+        lambda p: p.exists(),
+    ),
+}
+
+
+def export_tables(
+    output_dir: Path,
+    export_dir: Path,
+    tables: Iterable[str] = tuple(TABLES),
+    fmt: str = "parquet",
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    compression: str = "zstd",
+) -> Dict[str, int]:
+    """Export the selected tables found under ``output_dir``; return rows per table.
+
+    Tables whose input does not exist yet are skipped with a warning.
+    """
+    counts = {}
+    for name in tables:
+        table = TABLES[name]
+        source = output_dir / table.source
+        if not table.available(source):
+            logger.warning(f"⚠️ Skipping {name}: {source} not found")
+            continue
+        path = export_dir / f"{name}{FORMATS[fmt]}"
+        with METRICS.timer("export_seconds", "export", table=name):
+            counts[name] = write_table(
+                table.rows(source), table.schema, path, fmt, row_group_size, compression
+            )
+        METRICS.count("rows_written", counts[name], "export", table=name)
+        logger.info(f"📦 {name}: {counts[name]} rows → {path}")
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Export pages, chunks, Q&A pairs, conversation turns and image pairs as Parquet."
+    )
+    parser.add_argument(
+        "--output", type=str, default="outputs", help="ETL output folder to read from"
+    )
+    parser.add_argument(
+        "--export-dir",
+        type=str,
+        default=None,
+        help="Folder for the exported files (default: <output>/parquet)",
+    )
+    parser.add_argument(
+        "--tables",
+        type=str,
+        default=",".join(TABLES),
+        help=f"Comma-separated tables to export ({', '.join(TABLES)})",
+    )
+    parser.add_argument(
+        "--format",
+        choices=list(FORMATS),
+        default="parquet",
+        help="Parquet, or Arrow IPC files for zero-copy memory mapping",
+    )
+    parser.add_argument(
+        "--row-group-size",
+        type=int,
+        default=DEFAULT_ROW_GROUP_SIZE,
+        help="Rows per Parquet row group / Arrow record batch",
+    )
+    parser.add_argument(
+        "--compression",
+        type=str,
+        default="zstd",
+        help="Parquet compression codec (zstd, snappy, gzip, none)",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    tables = [t.strip() for t in args.tables.split(",") if t.strip()]
+    unknown = set(tables) - set(TABLES)
+    if unknown:
+        parser.error(f"Unknown tables: {', '.join(sorted(unknown))}")
+
+    start_metrics(args)
+    output_dir = Path(args.output)
+    export_tables(
+        output_dir,
+        Path(args.export_dir) if args.export_dir else output_dir / "parquet",
+        tables,
+        args.format,
+        args.row_group_size,
+        args.compression,
+    )
+    finish_metrics(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,67 +1,547 @@
+"""
+extract_image.py
+================
+
+Purpose:
+--------
+Extract embedded images from PDFs and write image–text pairs
+(``image_text_pairs.json``) for multimodal datasets. An image placed next to
+a vector caption ("Figure 3: ...", see captions.py) takes that caption and is
+not OCR'd; the others are captioned from OCR of their pixels. Images go into
+a content-addressed store (see image_store.py), so each unique image is
+saved and OCR'd once however often it occurs.
+
+Usable as a pipeline stage (CLI) or through ``extract_images`` /
+``iter_image_records``.
+"""
+
 import fitz  # PyMuPDF
 import json
+import logging
+import argparse
 import pytesseract
-from PIL import Image
+from collections import deque
+from concurrent.futures import Future
 from pathlib import Path
-from io import BytesIO
+from typing import Dict, Iterable, Iterator, List, Optional
 
-# Set paths
-pdf_dir = Path(r"D:\Data_Engineer_Task\task1_multimodal\pdfs")
-image_output_dir = Path(r"D:\Data_Engineer_Task\task1_multimodal\outputs\images")
-output_json = Path(
-    r"D:\Data_Engineer_Task\task1_multimodal\outputs\image_text_pairs.json"
+from cache import ExtractionCache
+from captions import DEFAULT_CAPTION_DISTANCE, CaptionIndex, image_type
+from checkpoint import Checkpoint, DocumentTimeout, DocumentTimer
+from image_store import DEFAULT_DHASH_DISTANCE, ImageStore
+from metrics import METRICS, add_metrics_arguments, finish_metrics, profile, start_metrics
+from ocr import OcrPool
+
+
+# === Logging Setup ===
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
 )
-image_output_dir.mkdir(parents=True, exist_ok=True)
-
-# Optional: Tesseract path
-pytesseract.pytesseract.tesseract_cmd = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-
-
-results = []
-pair_id = 1
-
-for pdf_file in pdf_dir.glob("*.pdf"):
-    doc = fitz.open(pdf_file)
-    for page_num, page in enumerate(doc):
-        images = page.get_images(full=True)
-        for img_index, img in enumerate(images):
-            xref = img[0]
-            base_image = doc.extract_image(xref)
-            image_bytes = base_image["image"]
-            image_ext = base_image["ext"]
-            image_filename = (
-                f"{pdf_file.stem}_p{page_num+1}_img{img_index+1}.{image_ext}"
-            )
-            image_path = image_output_dir / image_filename
-
-            # Save image
-            with open(image_path, "wb") as img_file:
-                img_file.write(image_bytes)
-
-            # OCR
-            img = Image.open(BytesIO(image_bytes))
-            ocr_text = pytesseract.image_to_string(img).strip()
-
-            # Add to results
-            results.append(
-                {
-                    "pair_id": f"img_{pair_id:03d}",
-                    "image_path": str(image_path.relative_to(image_output_dir.parent)),
-                    "image_type": "diagram",  # default guess
-                    "caption_short": (
-                        ocr_text.split("\n")[0][:80] if ocr_text else "No text detected"
-                    ),
-                    "caption_detailed": (
-                        ocr_text if ocr_text else "No description available"
-                    ),
-                    "source_document": pdf_file.name,
-                    "page_number": page_num + 1,
-                }
-            )
-            pair_id += 1
-
-# Save as JSON
-with open(output_json, "w", encoding="utf-8") as f:
-    json.dump({"image_text_pairs": results}, f, indent=2, ensure_ascii=False)
-
-print(f"[✓] Extracted {len(results)} image-text pairs.")
+logger = logging.getLogger("extract_image")
+
+# Bump whenever image records change, so cached pages are recomputed.
+IMAGE_EXTRACTOR_VERSION = "4"
+CACHE_NAMESPACE = "images"
+# Images below this many pixels (icons, bullets, rules) are skipped by default.
+DEFAULT_MIN_PIXELS = 1024
+
+
+def make_record(
+    image_path: Path,
+    image_root: Path,
+    ocr_text: Optional[str],
+    pdf_file: Path,
+    page_number: int,
+    caption: Optional[str] = None,
+    bbox: Optional[List[float]] = None,
+    image_hash: Optional[str] = None,
+    thumbnail_path: Optional[Path] = None,
+) -> Dict:
+    if caption:
+        kind, short, detailed, source = image_type(caption), caption[:80], caption, "vector"
+    else:
+        kind = "diagram"  # default guess
+        short = ocr_text.split("\n")[0][:80] if ocr_text else "No text detected"
+        detailed = ocr_text if ocr_text else "No description available"
+        source = "ocr"
+    return {
+        "image_path": str(image_path.relative_to(image_root)),
+        "image_type": kind,
+        "caption_short": short,
+        "caption_detailed": detailed,
+        "caption_source": source,
+        "bbox": bbox,
+        "image_hash": image_hash,
+        "thumbnail_path": (
+            str(thumbnail_path.relative_to(image_root)) if thumbnail_path else None
+        ),
+        "source_document": pdf_file.name,
+        "page_number": page_number,
+    }
+
+
+_ocr_errors_logged = set()
+
+
+def ocr_result(future: Future, document: str, page: int) -> Optional[str]:
+    """OCR text from ``future``; None if tesseract is missing or failed on the image.
+
+    Each distinct error is logged once, so a missing tesseract does not flood
+    the log (or quarantine the PDF): the image keeps an empty OCR caption.
+    """
+    try:
+        return future.result()
+    except (pytesseract.TesseractError, pytesseract.TesseractNotFoundError) as e:
+        METRICS.count("ocr_failures", 1, "images", document, page)
+        message = f"{type(e).__name__}: {e}"
+        if message not in _ocr_errors_logged:
+            _ocr_errors_logged.add(message)
+            logger.warning(f"⚠️ OCR failed, image captions left empty: {message}")
+        return None
+
+
+def stream_length(doc, xref: int) -> int:
+    """Encoded size of an image stream, read from its dictionary when possible."""
+    kind, value = doc.xref_get_key(xref, "Length")
+    if kind == "int":
+        return int(value)
+    return len(doc.xref_stream_raw(xref))
+
+
+def is_too_small(doc, img, min_pixels: int, min_bytes: int) -> bool:
+    """Check image size from ``page.get_images`` metadata, before decoding."""
+    xref, _, width, height = img[:4]
+    if width * height < min_pixels:
+        return True
+    return min_bytes > 0 and stream_length(doc, xref) < min_bytes
+
+
+def iter_document_images(
+    pdf_file: Path,
+    store: ImageStore,
+    ocr: OcrPool,
+    cache: Optional[ExtractionCache] = None,
+    min_pixels: int = DEFAULT_MIN_PIXELS,
+    min_bytes: int = 0,
+    skip: Iterable[int] = frozenset(),
+    timeout: Optional[float] = None,
+    caption_distance: float = DEFAULT_CAPTION_DISTANCE,
+    ocr_futures: Optional[Dict[str, Future]] = None,
+) -> Iterator[Dict]:
+    """Yield image records (without ``pair_id``) for one PDF in page order.
+
+    Images with a caption block within ``caption_distance`` points take it as
+    their caption and skip OCR (0 = always OCR). Other images are OCR'd once
+    per stored blob: ``ocr_futures`` (blob key -> OCR result) can be shared
+    across documents, and OCR text kept in the store's manifest is reused.
+    Pages in ``skip`` (already written) are left out; ``DocumentTimeout`` is
+    raised once extraction and OCR have taken ``timeout`` seconds.
+    """
+    image_root = store.root.parent
+    timer = DocumentTimer(timeout, pdf_file.name)
+    version = (
+        f"{IMAGE_EXTRACTOR_VERSION}:{min_pixels}:{min_bytes}:{caption_distance:g}:"
+        f"{store.dhash_distance}:{store.thumbnail_size}"
+    )
+    ocr_futures = {} if ocr_futures is None else ocr_futures
+    doc_hash = cache.file_hash(pdf_file) if cache is not None else None
+
+    def cached_page_records(page_number):
+        """Cached records for a page, provided their image files still exist."""
+        if cache is None:
+            return None
+        records = cache.get_page(doc_hash, CACHE_NAMESPACE, version, page_number)
+        if records is None:
+            return None
+        if not all((image_root / r["image_path"]).exists() for r in records):
+            return None
+        return records
+
+    doc = None
+    if cache is not None and cache.is_complete(doc_hash, CACHE_NAMESPACE, version):
+        n_pages = len(cache.page_numbers(doc_hash, CACHE_NAMESPACE, version))
+    else:
+        with timer.running():
+            doc = fitz.open(pdf_file)
+        n_pages = doc.page_count
+
+    def finish(page_number, page_records, entries):
+        """Records of a page, once its OCR results are in (cached pages: as is)."""
+        if page_records is None:
+            with timer.running():
+                page_records = []
+                ocr_failed = False
+                for image, future, caption, bbox in entries:
+                    ocr_text = None
+                    if future is not None:
+                        ocr_text = ocr_result(future, pdf_file.name, page_number)
+                        if ocr_text is None:
+                            ocr_failed = True
+                        else:
+                            store.set_ocr_text(image.key, ocr_text)
+                    page_records.append(
+                        make_record(
+                            store.root / image.path,
+                            image_root,
+                            ocr_text,
+                            pdf_file,
+                            page_number,
+                            caption,
+                            bbox,
+                            image.key,
+                            store.root / image.thumbnail if image.thumbnail else None,
+                        )
+                    )
+            if ocr_failed:
+                # Not cached, so a later run with a working tesseract fills it in.
+                failed_pages.add(page_number)
+            elif cache is not None:
+                cache.put_page(doc_hash, CACHE_NAMESPACE, version, page_number, page_records)
+
+        METRICS.count("images", len(page_records), "images", pdf_file.name)
+        return [{**record, "source_document": pdf_file.name} for record in page_records]
+
+    def ready(item):
+        entries = item[2]
+        return entries is None or all(e[1] is None or e[1].done() for e in entries)
+
+    # Each xref is extracted once per document, however many pages it appears
+    # on; the store and ``ocr_futures`` dedupe it across documents.
+    xref_seen = {}
+    pending = deque()
+    failed_pages = set()
+    n_skipped = 0
+    for page_num in range(n_pages):
+        # Earlier pages stream out, in order, as soon as their OCR results are in.
+        while pending and ready(pending[0]):
+            yield from finish(*pending.popleft())
+        if page_num + 1 in skip:
+            continue
+        with timer.running():
+            page_records = cached_page_records(page_num + 1)
+            if page_records is not None:
+                pending.append((page_num + 1, page_records, None))
+                continue
+
+            if doc is None:
+                doc = fitz.open(pdf_file)
+            page = doc[page_num]
+            entries = []
+            with METRICS.timer("parse_seconds", "images", pdf_file.name, page_num + 1):
+                images = page.get_images(full=True)
+                captions = None
+                for img_index, img in enumerate(images):
+                    xref = img[0]
+                    image_bytes = None
+                    if xref not in xref_seen:
+                        if is_too_small(doc, img, min_pixels, min_bytes):
+                            xref_seen[xref] = None
+                        else:
+                            base_image = doc.extract_image(xref)
+                            image_bytes = base_image["image"]
+                            with METRICS.timer("store_seconds", "images", pdf_file.name, page_num + 1):
+                                xref_seen[xref] = store.put(
+                                    image_bytes,
+                                    base_image["ext"],
+                                    base_image["width"],
+                                    base_image["height"],
+                                )
+                    image = xref_seen[xref]
+                    if image is None:
+                        n_skipped += 1
+                        continue
+                    store.add_occurrence(pdf_file.name, page_num + 1, img_index + 1, image)
+
+                    rects = page.get_image_rects(xref)
+                    bbox = [round(v, 2) for v in rects[0]] if rects else None
+                    caption = None
+                    if bbox is not None and caption_distance > 0:
+                        if captions is None:
+                            with METRICS.timer("caption_seconds", "images", pdf_file.name, page_num + 1):
+                                captions = CaptionIndex.from_page(page)
+                        caption = captions.nearest(bbox, caption_distance)
+                    if caption is not None:
+                        METRICS.count("vector_captions", 1, "images", pdf_file.name, page_num + 1)
+                        entries.append((image, None, caption.text, bbox))
+                        continue
+                    future = ocr_futures.get(image.key)
+                    if future is None:
+                        text = store.ocr_text(image.key)
+                        if text is not None:
+                            future = Future()
+                            future.set_result(text)
+                        else:
+                            # Near-duplicates are OCR'd as their stored copy.
+                            if image_bytes is None or image.key != image.sha256:
+                                image_bytes = (store.root / image.path).read_bytes()
+                            future = ocr.submit(
+                                image_bytes, "images", pdf_file.name, page_num + 1
+                            )
+                        ocr_futures[image.key] = future
+                    entries.append((image, future, None, bbox))
+            pending.append((page_num + 1, None, entries))
+    while pending:
+        yield from finish(*pending.popleft())
+
+    store.commit()
+    if doc is not None:
+        doc.close()
+        if cache is not None and not skip and not failed_pages:
+            cache.mark_complete(doc_hash, CACHE_NAMESPACE, version, n_pages)
+    METRICS.count("skipped_images", n_skipped, "images", pdf_file.name)
+    if n_skipped:
+        logger.info(f"{pdf_file.name}: skipped {n_skipped} images below size threshold")
+
+
+def iter_image_records(
+    pdf_files: Iterable[Path],
+    image_output_dir: Path,
+    cache: Optional[ExtractionCache] = None,
+    ocr_workers: Optional[int] = None,
+    min_pixels: int = DEFAULT_MIN_PIXELS,
+    min_bytes: int = 0,
+    checkpoint: Optional[Checkpoint] = None,
+    timeout: Optional[float] = None,
+    caption_distance: float = DEFAULT_CAPTION_DISTANCE,
+    dhash_distance: int = DEFAULT_DHASH_DISTANCE,
+    thumbnail_size: Optional[int] = None,
+) -> Iterator[Dict]:
+    """Yield image–text pair records with sequential ``pair_id`` values.
+
+    Images are stored in an ``ImageStore`` under ``image_output_dir``. With a
+    resumed ``checkpoint``, pages already written are skipped and numbering
+    continues after them. A PDF that fails or runs out of its ``timeout`` is
+    quarantined and the batch moves on.
+    """
+    store = ImageStore(image_output_dir, dhash_distance, thumbnail_size)
+    ocr = OcrPool(ocr_workers)
+    ocr_futures: Dict[str, Future] = {}
+    pair_id = checkpoint.last.get("records", 0) + 1 if checkpoint is not None else 1
+    try:
+        for pdf_file in pdf_files:
+            done = set()
+            if checkpoint is not None:
+                if pdf_file.name in checkpoint.quarantined:
+                    logger.warning(f"🚫 Skipping quarantined PDF: {pdf_file.name}")
+                    continue
+                done = checkpoint.done.get(pdf_file.name, set())
+            logger.info(f"Processing images: {pdf_file.name}")
+            try:
+                with profile(f"images_{pdf_file.name}"):
+                    for record in iter_document_images(
+                        pdf_file, store, ocr, cache, min_pixels, min_bytes,
+                        skip=done, timeout=timeout, caption_distance=caption_distance,
+                        ocr_futures=ocr_futures,
+                    ):
+                        yield {"pair_id": f"img_{pair_id:03d}", **record}
+                        pair_id += 1
+            except (Exception, DocumentTimeout) as e:
+                reason = f"{type(e).__name__}: {e}"
+                logger.warning(f"🚫 Quarantined {pdf_file.name}: {reason}")
+                METRICS.count("quarantined", 1, "images", pdf_file.name)
+                if checkpoint is not None:
+                    checkpoint.quarantine(pdf_file.name, reason)
+    finally:
+        ocr.close()
+        store.close()
+
+
+def write_image_pairs(
+    records: Iterable[Dict], output_json: Path, checkpoint: Optional[Checkpoint] = None
+) -> int:
+    """Stream records into ``{"image_text_pairs": [...]}`` as they arrive.
+
+    With a ``checkpoint`` the records are appended to its file and each page
+    is committed once all of its records are written.
+    """
+    if checkpoint is None:
+        f = open(output_json, "w", encoding="utf-8")
+        n_records = 0
+    else:
+        f = checkpoint.files[0]
+        n_records = checkpoint.last.get("records", 0)
+    unit = None
+    try:
+        if f.tell() == 0:
+            f.write('{\n  "image_text_pairs": [')
+        for record in records:
+            record_unit = (record["source_document"], record["page_number"])
+            if checkpoint is not None and unit is not None and record_unit != unit:
+                checkpoint.commit(*unit, records=n_records)
+            unit = record_unit
+            record_json = json.dumps(record, indent=2, ensure_ascii=False)
+            f.write(",\n    " if n_records else "\n    ")
+            f.write(record_json.replace("\n", "\n    "))
+            f.flush()
+            METRICS.count("rows_written", 1, "images", record["source_document"], output="json")
+            n_records += 1
+        if checkpoint is not None and unit is not None:
+            checkpoint.commit(*unit, records=n_records)
+        f.write("\n  ]\n}" if n_records else "]\n}")
+    finally:
+        if checkpoint is None:
+            f.close()
+        else:
+            f.flush()
+    return n_records
+
+
+def extract_images(
+    pdf_dir: Path,
+    image_output_dir: Path,
+    output_json: Path,
+    cache: Optional[ExtractionCache] = None,
+    ocr_workers: Optional[int] = None,
+    min_pixels: int = DEFAULT_MIN_PIXELS,
+    min_bytes: int = 0,
+    resume: bool = False,
+    timeout: Optional[float] = None,
+    caption_distance: float = DEFAULT_CAPTION_DISTANCE,
+    dhash_distance: int = DEFAULT_DHASH_DISTANCE,
+    thumbnail_size: Optional[int] = None,
+) -> int:
+    """Extract and caption every image of every PDF in ``pdf_dir``; return the pair count.
+
+    Progress is checkpointed next to ``output_json`` (``.checkpoint.jsonl``),
+    so ``resume=True`` continues an interrupted run.
+    """
+    output_json = Path(output_json)
+    checkpoint = Checkpoint(
+        output_json.with_suffix(".checkpoint.jsonl"), [output_json], resume
+    )
+    try:
+        records = iter_image_records(
+            list(Path(pdf_dir).glob("*.pdf")),
+            Path(image_output_dir),
+            cache=cache,
+            ocr_workers=ocr_workers,
+            min_pixels=min_pixels,
+            min_bytes=min_bytes,
+            checkpoint=checkpoint,
+            timeout=timeout,
+            caption_distance=caption_distance,
+            dhash_distance=dhash_distance,
+            thumbnail_size=thumbnail_size,
+        )
+        return write_image_pairs(records, output_json, checkpoint)
+    finally:
+        checkpoint.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Extract embedded images from PDFs and OCR them into image-text pairs."
+    )
+    parser.add_argument(
+        "--input", type=str, default="../pdfs", help="Input folder containing PDFs"
+    )
+    parser.add_argument(
+        "--images",
+        type=str,
+        default="outputs/images",
+        help="Image store folder (content-addressed blobs, thumbnails, manifest.db)",
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default="outputs/image_text_pairs.json",
+        help="Path to save image-text pairs JSON",
+    )
+    parser.add_argument(
+        "--min-pixels",
+        type=int,
+        default=DEFAULT_MIN_PIXELS,
+        help="Skip images with fewer pixels (width x height) than this",
+    )
+    parser.add_argument(
+        "--min-bytes",
+        type=int,
+        default=0,
+        help="Skip images whose encoded stream is smaller than this",
+    )
+    parser.add_argument(
+        "--caption-distance",
+        type=float,
+        default=DEFAULT_CAPTION_DISTANCE,
+        help="Use a vector caption block within this many points of an image "
+        "instead of OCR (0 = always OCR)",
+    )
+    parser.add_argument(
+        "--dhash-distance",
+        type=int,
+        default=DEFAULT_DHASH_DISTANCE,
+        help="Store images within this many dHash bits of a stored one as that one, "
+        "e.g. 4 for re-encoded copies (default -1 = only byte-identical images)",
+    )
+    parser.add_argument(
+        "--thumbnails",
+        type=int,
+        default=None,
+        help="Also write JPEG thumbnails with this longest side in pixels",
+    )
+    parser.add_argument(
+        "--ocr-workers", type=int, default=None, help="Number of concurrent OCR calls"
+    )
+    parser.add_argument(
+        "--tesseract-cmd",
+        type=str,
+        default=None,
+        help="Path to the tesseract executable if it is not on PATH",
+    )
+    parser.add_argument(
+        "--cache",
+        type=str,
+        default="outputs/cache/extraction_cache.db",
+        help="SQLite cache of image records keyed by PDF content hash",
+    )
+    parser.add_argument(
+        "--no-cache", action="store_true", help="Ignore and do not update the cache"
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Continue an interrupted run from the checkpoint manifest next to --output",
+    )
+    parser.add_argument(
+        "--doc-timeout",
+        type=float,
+        default=None,
+        help="Quarantine a PDF after this many seconds of extraction and OCR",
+    )
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+    start_metrics(args)
+
+    if args.tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = args.tesseract_cmd
+
+    output_json = Path(args.output)
+    output_json.parent.mkdir(parents=True, exist_ok=True)
+    cache = None if args.no_cache else ExtractionCache(Path(args.cache))
+    try:
+        n_pairs = extract_images(
+            Path(args.input),
+            Path(args.images),
+            output_json,
+            cache=cache,
+            ocr_workers=args.ocr_workers,
+            min_pixels=args.min_pixels,
+            min_bytes=args.min_bytes,
+            resume=args.resume,
+            timeout=args.doc_timeout,
+            caption_distance=args.caption_distance,
+            dhash_distance=args.dhash_distance,
+            thumbnail_size=args.thumbnails,
+        )
+    finally:
+        if cache is not None:
+            cache.close()
+
+    finish_metrics(args)
+    logger.info(f"✅ Extracted {n_pairs} image-text pairs to: {output_json}")
+
+
+if __name__ == "__main__":
+    main()
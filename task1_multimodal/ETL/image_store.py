@@ -0,0 +1,255 @@
+"""
+image_store.py
+==============
+
+Content-addressed store for extracted images.
+
+Each distinct image is written once, as ``blobs/<h[:2]>/<h[2:4]>/<h>.<ext>``
+(``h`` = SHA-256 of its bytes) under the store folder, however often it occurs
+in the corpus (logos, stamps, repeated headers). Near-duplicate matching is
+opt-in: with ``dhash_distance >= 0`` new images are also checked against a
+64-bit difference hash (dHash) index, so near-identical copies (re-encoded,
+slightly resized) collapse onto the first one instead of being stored again.
+It is off by default because distinct but similar figures (scans or charts
+that differ in a small detail) can fall within a few bits. The SQLite
+manifest (``manifest.db``) maps every occurrence ``(document, page, index)``
+to its blob and keeps each blob's OCR text, so OCR also runs once per unique
+image. Optional thumbnails are written once per blob to ``thumbs/``.
+"""
+
+import hashlib
+import io
+import logging
+import os
+import sqlite3
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image
+
+from metrics import METRICS
+
+
+logger = logging.getLogger("image_store")
+
+# Exact (byte-identical) matches only; near-duplicate matching is opt-in.
+DEFAULT_DHASH_DISTANCE = -1
+HASH_BITS = 64
+
+
+def dhash(image_bytes: bytes) -> Optional[int]:
+    """64-bit difference hash: brightness gradients of a 9x8 grayscale thumbnail.
+
+    None when PIL cannot decode the image (e.g. JBIG2 or JPX streams).
+    """
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as img:
+            img.draft("L", (64, 64))  # JPEG: decode at reduced scale
+            pixels = img.convert("L").resize((9, 8), Image.Resampling.LANCZOS).tobytes()
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            i = row * 9 + col
+            bits = bits << 1 | (pixels[i] > pixels[i + 1])
+    return bits
+
+
+class HashIndex:
+    """Finds a stored hash within ``max_distance`` bits of a query.
+
+    Multi-index hashing: the 64 bits are cut into ``max_distance + 1`` chunks,
+    and by the pigeonhole principle two hashes that close agree exactly on at
+    least one chunk, so only hashes sharing a chunk value are compared.
+    """
+
+    def __init__(self, max_distance: int):
+        self.max_distance = max_distance
+        n_chunks = max_distance + 1
+        edges = [round(i * HASH_BITS / n_chunks) for i in range(n_chunks + 1)]
+        self.chunks = [(lo, (1 << (hi - lo)) - 1) for lo, hi in zip(edges, edges[1:])]
+        self.tables: List[Dict[int, List[Tuple[int, str]]]] = [
+            defaultdict(list) for _ in self.chunks
+        ]
+
+    def add(self, value: int, key: str):
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            table[(value >> shift) & mask].append((value, key))
+
+    def find(self, value: int) -> Optional[str]:
+        """Key of the closest stored hash within ``max_distance``, else None."""
+        best, best_distance = None, self.max_distance + 1
+        for table, (shift, mask) in zip(self.tables, self.chunks):
+            for other, key in table.get((value >> shift) & mask, ()):
+                distance = (value ^ other).bit_count()
+                if distance < best_distance:
+                    best, best_distance = key, distance
+        return best
+
+
+class StoredImage(NamedTuple):
+    """Where an image ended up: ``sha256`` is its own hash, ``key`` the hash of
+    the blob kept for it (the first copy, for near-duplicates); paths are
+    relative to the store folder."""
+
+    sha256: str
+    key: str
+    path: str
+    thumbnail: Optional[str]
+
+
+class ImageStore:
+    """Blobs, thumbnails and the occurrence manifest under one folder.
+
+    ``dhash_distance`` is the largest Hamming distance at which two images
+    count as the same (negative = only byte-identical images collapse);
+    ``thumbnail_size`` is the longest side of thumbnails (None = none).
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        dhash_distance: int = DEFAULT_DHASH_DISTANCE,
+        thumbnail_size: Optional[int] = None,
+    ):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.dhash_distance = dhash_distance
+        self.thumbnail_size = thumbnail_size
+        self.conn = sqlite3.connect(self.root / "manifest.db")
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS blobs (
+                sha256 TEXT PRIMARY KEY,
+                canonical TEXT,
+                path TEXT,
+                thumbnail TEXT,
+                dhash TEXT,
+                width INTEGER,
+                height INTEGER,
+                bytes INTEGER,
+                ocr_text TEXT
+            );
+            CREATE TABLE IF NOT EXISTS occurrences (
+                document TEXT,
+                page INTEGER,
+                image_index INTEGER,
+                sha256 TEXT,
+                canonical TEXT,
+                PRIMARY KEY (document, page, image_index)
+            );
+            """
+        )
+        self.index = HashIndex(max(dhash_distance, 0))
+        if dhash_distance >= 0:
+            rows = self.conn.execute(
+                "SELECT sha256, dhash FROM blobs WHERE sha256 = canonical AND dhash IS NOT NULL"
+            )
+            for key, value in rows:
+                self.index.add(int(value, 16), key)
+
+    def _blob(self, sha: str) -> Optional[StoredImage]:
+        row = self.conn.execute(
+            "SELECT canonical, path, thumbnail FROM blobs WHERE sha256 = ?", (sha,)
+        ).fetchone()
+        return StoredImage(sha, *row) if row else None
+
+    def _write(self, relative: str, data: bytes):
+        """Write a file atomically, so a crash never leaves a truncated blob."""
+        path = self.root / relative
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _thumbnail(self, key: str, image_bytes: bytes) -> Optional[str]:
+        relative = f"thumbs/{key[:2]}/{key[2:4]}/{key}.jpg"
+        if (self.root / relative).exists():
+            return relative
+        try:
+            with Image.open(io.BytesIO(image_bytes)) as img:
+                img.draft("RGB", (self.thumbnail_size, self.thumbnail_size))
+                thumb = img.convert("RGB")
+                thumb.thumbnail((self.thumbnail_size, self.thumbnail_size))
+                out = io.BytesIO()
+                thumb.save(out, "JPEG", quality=85)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+        self._write(relative, out.getvalue())
+        return relative
+
+    def _with_thumbnail(self, image: StoredImage) -> StoredImage:
+        """Add the thumbnail of a blob stored while thumbnails were off."""
+        if not self.thumbnail_size or image.thumbnail is not None:
+            return image
+        thumbnail = self._thumbnail(image.key, (self.root / image.path).read_bytes())
+        self.conn.execute(
+            "UPDATE blobs SET thumbnail = ? WHERE canonical = ?", (thumbnail, image.key)
+        )
+        return image._replace(thumbnail=thumbnail)
+
+    def put(self, image_bytes: bytes, ext: str, width: int = 0, height: int = 0) -> StoredImage:
+        """Store an image unless it (or a near-identical one) already is."""
+        sha = hashlib.sha256(image_bytes).hexdigest()
+        stored = self._blob(sha)
+        if stored is not None:
+            if stored.key == sha and not (self.root / stored.path).exists():
+                self._write(stored.path, image_bytes)  # blob deleted since
+            METRICS.count("duplicate_images", 1, "images", kind="exact")
+            return self._with_thumbnail(stored)
+
+        value = dhash(image_bytes)
+        canonical = None
+        if value is not None and self.dhash_distance >= 0:
+            canonical = self.index.find(value)
+        if canonical is not None:
+            _, _, path, thumbnail = self._with_thumbnail(self._blob(canonical))
+            METRICS.count("duplicate_images", 1, "images", kind="near")
+        else:
+            canonical = sha
+            path = f"blobs/{sha[:2]}/{sha[2:4]}/{sha}.{ext}"
+            self._write(path, image_bytes)
+            thumbnail = self._thumbnail(sha, image_bytes) if self.thumbnail_size else None
+            if value is not None:
+                self.index.add(value, sha)
+            METRICS.count("unique_images", 1, "images")
+            METRICS.count("stored_bytes", len(image_bytes), "images")
+        self.conn.execute(
+            "INSERT INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, NULL)",
+            (
+                sha,
+                canonical,
+                path,
+                thumbnail,
+                f"{value:016x}" if value is not None else None,
+                width,
+                height,
+                len(image_bytes),
+            ),
+        )
+        return StoredImage(sha, canonical, path, thumbnail)
+
+    def add_occurrence(self, document: str, page: int, index: int, image: StoredImage):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO occurrences VALUES (?, ?, ?, ?, ?)",
+            (document, page, index, image.sha256, image.key),
+        )
+
+    def ocr_text(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT ocr_text FROM blobs WHERE sha256 = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_ocr_text(self, key: str, text: str):
+        self.conn.execute("UPDATE blobs SET ocr_text = ? WHERE sha256 = ?", (text, key))
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
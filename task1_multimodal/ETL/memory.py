@@ -0,0 +1,91 @@
+"""
+memory.py
+=========
+
+Memory bounds for page extraction.
+
+Large PDFs are read in windows of ``page_window`` pages: each window is a
+fresh pdfplumber document, so the parsed page objects and pdfminer caches of
+earlier windows can be freed. With ``max_rss_mb`` the current window is also
+closed early whenever the process's resident memory goes above the ceiling;
+if releasing memory does not bring it back under, ``MemoryCeilingExceeded``
+is raised rather than letting the worker be OOM-killed.
+"""
+
+import ctypes
+import ctypes.util
+import gc
+import logging
+import os
+from typing import NamedTuple, Optional
+
+import pypdfium2 as pdfium
+
+
+logger = logging.getLogger("memory")
+
+DEFAULT_PAGE_WINDOW = 100
+
+try:
+    _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+    _malloc_trim = _libc.malloc_trim
+except (OSError, AttributeError):  # not glibc
+    _malloc_trim = None
+
+
+class MemorySettings(NamedTuple):
+    """Reopen the PDF every ``page_window`` pages (0 = never) and keep
+    resident memory under ``max_rss_mb`` (None = no ceiling)."""
+
+    page_window: int = DEFAULT_PAGE_WINDOW
+    max_rss_mb: Optional[float] = None
+
+
+class MemoryCeilingExceeded(MemoryError):
+    """Resident memory is still above the ceiling after flushing the page caches."""
+
+
+def rss_mb() -> Optional[float]:
+    """Current resident set size in MiB from ``/proc/self/statm`` (None elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+    except (OSError, IndexError, ValueError):
+        return None
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1 << 20)
+
+
+def over_ceiling(settings: MemorySettings) -> bool:
+    if settings.max_rss_mb is None:
+        return False
+    rss = rss_mb()
+    return rss is not None and rss > settings.max_rss_mb
+
+
+def release_memory():
+    """Collect garbage and hand freed heap pages back to the OS where glibc allows it."""
+    gc.collect()
+    if _malloc_trim is not None:
+        _malloc_trim(0)
+
+
+def enforce_ceiling(settings: MemorySettings, where: str):
+    """After a window was closed: release memory if over the ceiling, and raise
+    if it still does not come down."""
+    if not over_ceiling(settings):
+        return
+    release_memory()
+    if over_ceiling(settings):
+        raise MemoryCeilingExceeded(
+            f"{where}: {rss_mb():.0f} MiB resident after flushing page caches "
+            f"(ceiling {settings.max_rss_mb:.0f} MiB)"
+        )
+
+
+def count_pdf_pages(pdf_path) -> int:
+    """Page count without building pdfplumber page objects for the whole document."""
+    doc = pdfium.PdfDocument(pdf_path)
+    try:
+        return len(doc)
+    finally:
+        doc.close()
@@ -0,0 +1,271 @@
+"""
+metrics.py
+==========
+
+Instrumentation shared by the ETL stages.
+
+``METRICS`` collects timers (count / sum / max seconds) and counters labelled
+by stage and document, plus a per-page table for observations made with a
+``page``. Page numbers are kept out of the aggregated series so the
+Prometheus export stays small. Worker processes ``drain`` their metrics and
+the parent ``merge``s them.
+
+``--profile`` wraps each document in cProfile plus tracemalloc and keeps the
+slowest ones as ``.prof`` files and allocation reports.
+"""
+
+import argparse
+import cProfile
+import heapq
+import itertools
+import json
+import logging
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+
+logger = logging.getLogger("metrics")
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(stage: str, document: Optional[str], extra: Dict[str, Any]) -> Labels:
+    labels = {"stage": stage, **({"document": document} if document else {}), **extra}
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+class Metrics:
+    """Thread-safe registry of timers, counters and per-page observations."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers: Dict[Tuple[str, Labels], List[float]] = {}
+        self.counters: Dict[Tuple[str, Labels], float] = {}
+        self.pages: Dict[Tuple[str, str, int], Dict[str, float]] = {}
+
+    def _page(self, stage: str, document: Optional[str], page: Optional[int], name: str, value):
+        if page is None:
+            return
+        row = self.pages.setdefault((stage, document or "", page), {})
+        row[name] = row.get(name, 0) + value
+
+    def observe(
+        self,
+        name: str,
+        seconds: float,
+        stage: str,
+        document: Optional[str] = None,
+        page: Optional[int] = None,
+        **labels,
+    ):
+        key = (name, _labels(stage, document, labels))
+        with self.lock:
+            timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+            timer[0] += 1
+            timer[1] += seconds
+            timer[2] = max(timer[2], seconds)
+            self._page(stage, document, page, name, seconds)
+
+    def count(
+        self,
+        name: str,
+        value: float = 1,
+        stage: str = "",
+        document: Optional[str] = None,
+        page: Optional[int] = None,
+        **labels,
+    ):
+        key = (name, _labels(stage, document, labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+            self._page(stage, document, page, name, value)
+
+    @contextmanager
+    def timer(self, name: str, stage: str, document: Optional[str] = None, page=None, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, stage, document, page, **labels)
+
+    def drain(self) -> Dict:
+        """Return everything recorded so far and reset (used by worker processes)."""
+        with self.lock:
+            snapshot = {"timers": self.timers, "counters": self.counters, "pages": self.pages}
+            self.timers, self.counters, self.pages = {}, {}, {}
+        return snapshot
+
+    def merge(self, snapshot: Dict):
+        with self.lock:
+            for key, (n, total, peak) in snapshot["timers"].items():
+                timer = self.timers.setdefault(key, [0, 0.0, 0.0])
+                timer[0] += n
+                timer[1] += total
+                timer[2] = max(timer[2], peak)
+            for key, value in snapshot["counters"].items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, values in snapshot["pages"].items():
+                row = self.pages.setdefault(key, {})
+                for name, value in values.items():
+                    row[name] = row.get(name, 0) + value
+
+    def to_dict(self) -> Dict:
+        with self.lock:
+            return {
+                "timers": [
+                    {"name": name, "labels": dict(labels), "count": n, "sum": total, "max": peak}
+                    for (name, labels), (n, total, peak) in sorted(self.timers.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "pages": [
+                    {"stage": stage, "document": document, "page": page, **values}
+                    for (stage, document, page), values in sorted(self.pages.items())
+                ],
+            }
+
+    def to_prometheus(self) -> str:
+        def series(name: str, labels: Labels) -> str:
+            name = "etl_" + re.sub(r"[^a-zA-Z0-9_]", "_", name)
+            if not labels:
+                return name
+            escaped = (
+                f'{k}="{v.replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+                for k, v in labels
+            )
+            return f"{name}{{{','.join(escaped)}}}"
+
+        lines = []
+        with self.lock:
+            for (name, labels), (n, total, peak) in sorted(self.timers.items()):
+                lines.append(f"{series(name + '_count', labels)} {n}")
+                lines.append(f"{series(name + '_sum', labels)} {total:.6f}")
+                lines.append(f"{series(name + '_max', labels)} {peak:.6f}")
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"{series(name + '_total', labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: Path):
+        """Write Prometheus text for ``.prom``/``.txt`` paths, JSON otherwise."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        if path.suffix in (".prom", ".txt"):
+            path.write_text(self.to_prometheus(), encoding="utf-8")
+        else:
+            path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    def log_summary(self):
+        """Log total time per stage and timer, slowest first."""
+        totals: Dict[Tuple[str, str], float] = {}
+        with self.lock:
+            for (name, labels), (_, total, _) in self.timers.items():
+                stage = dict(labels).get("stage", "")
+                totals[(stage, name)] = totals.get((stage, name), 0.0) + total
+        for (stage, name), total in sorted(totals.items(), key=lambda kv: -kv[1]):
+            logger.info(f"📊 {stage:<13} {name:<20} {total:8.3f}s")
+
+
+METRICS = Metrics()
+
+
+class Profiler:
+    """cProfile + tracemalloc per document, keeping only the ``keep`` slowest."""
+
+    def __init__(self, output_dir: Path, keep: int = 3):
+        self.output_dir = output_dir
+        self.keep = keep
+        self.slowest: List[Tuple[float, int, str, cProfile.Profile, List[str]]] = []
+        self.order = itertools.count()
+        self.active = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    @contextmanager
+    def profile(self, name: str):
+        # One profiler at a time: nested documents (e.g. a downstream stage
+        # pulling pages through an upstream one) count towards the outer one.
+        if self.active:
+            yield
+            return
+        self.active = True
+        profile = cProfile.Profile()
+        before = tracemalloc.take_snapshot()
+        started = time.perf_counter()
+        profile.enable()
+        try:
+            yield
+        finally:
+            profile.disable()
+            elapsed = time.perf_counter() - started
+            after = tracemalloc.take_snapshot()
+            top = [str(s) for s in after.compare_to(before, "lineno")[:25]]
+            self.active = False
+            heapq.heappush(self.slowest, (elapsed, next(self.order), name, profile, top))
+            if len(self.slowest) > self.keep:
+                heapq.heappop(self.slowest)
+
+    def dump(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        for elapsed, _, name, profile, top in sorted(self.slowest, reverse=True):
+            stem = re.sub(r"[^\w.-]", "_", name)
+            profile.dump_stats(self.output_dir / f"{stem}.prof")
+            (self.output_dir / f"{stem}.tracemalloc.txt").write_text(
+                "\n".join(top) + "\n", encoding="utf-8"
+            )
+            logger.info(f"🔬 {name}: {elapsed:.2f}s, profile saved to {self.output_dir}/{stem}.prof")
+
+
+PROFILER: Optional[Profiler] = None
+
+
+@contextmanager
+def profile(name: str):
+    """Profile a unit of work when ``--profile`` is on; otherwise a no-op."""
+    if PROFILER is None:
+        yield
+    else:
+        with PROFILER.profile(name):
+            yield
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    """Add the shared ``--metrics`` / ``--profile`` flags to a stage's parser."""
+    parser.add_argument(
+        "--metrics",
+        type=str,
+        default=None,
+        help="Write timers/counters to this file (.prom/.txt for Prometheus text, else JSON)",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Dump cProfile/tracemalloc snapshots for the slowest documents",
+    )
+    parser.add_argument(
+        "--profile-dir", type=str, default="outputs/profiles", help="Folder for profiles"
+    )
+    parser.add_argument(
+        "--profile-top", type=int, default=3, help="Number of slowest documents to keep"
+    )
+
+
+def start_metrics(args: argparse.Namespace):
+    global PROFILER
+    if args.profile:
+        PROFILER = Profiler(Path(args.profile_dir), args.profile_top)
+
+
+def finish_metrics(args: argparse.Namespace):
+    """Log the summary, export metrics and dump the kept profiles."""
+    METRICS.log_summary()
+    if args.metrics:
+        METRICS.export(Path(args.metrics))
+        logger.info(f"📊 Metrics saved to: {args.metrics}")
+    if PROFILER is not None:
+        PROFILER.dump()
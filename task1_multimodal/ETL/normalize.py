@@ -0,0 +1,71 @@
+"""
+normalize.py
+============
+
+Page text normaliser used by ``clean_text`` in stage 1.
+
+Default transformations, in order (same output as the original five
+``re.sub`` passes):
+
+1. join words hyphenated across a line break (``"treat-\\n ment"`` → ``"treatment"``);
+2. turn every line break and every run of two or more whitespace characters
+   into a single space;
+3. strip, and drop a page whose whole text is a bare number (page numbers).
+
+Optional medical rules (``medical=True``) additionally:
+
+- expand typographic ligatures (``ﬁ`` → ``fi``) and map unicode dashes and
+  the minus sign to ``-``, before step 1;
+- write micrograms as ``mcg`` and put one space between a number and its unit
+  (``5mg`` → ``5 mg``, ``2 mmol / L`` → ``2 mmol/L``).
+
+All patterns are compiled once at import.
+"""
+
+import re
+
+
+DEHYPHENATE_RE = re.compile(r"(\w)-\s*\n\s*(\w)")
+# Cheap literal-led scan: the full pattern only runs on pages that can match it.
+LINE_END_HYPHEN_RE = re.compile(r"-\s*\n")
+WHITESPACE_RE = re.compile(r"\s{2,}|\n")
+
+LIGATURES = {
+    "ﬀ": "ff",
+    "ﬁ": "fi",
+    "ﬂ": "fl",
+    "ﬃ": "ffi",
+    "ﬄ": "ffl",
+    "ﬅ": "st",
+    "ﬆ": "st",
+}
+DASHES = dict.fromkeys("‐‑‒–—―−﹘﹣－", "-")
+MEDICAL_CHARS = {**LIGATURES, **DASHES}
+MEDICAL_CHAR_RE = re.compile(f"[{''.join(MEDICAL_CHARS)}]")
+
+UNITS = r"mcg|mg|kg|g|mL|ml|dL|L|mmol|mEq|IU|units?|mmHg"
+MICROGRAM_RE = re.compile(r"[µμ]g\b")
+UNIT_SPACING_RE = re.compile(rf"(\d)\s*({UNITS})\b")
+UNIT_RATIO_RE = re.compile(rf"\b({UNITS})\s*/\s*(L|dL|mL|kg|min|h|hr|day|d)\b")
+
+
+def normalize(text: str, medical: bool = False) -> str:
+    """Normalise extracted page text (see module docstring)."""
+    if not text:
+        return ""
+
+    if medical:
+        # Before dehyphenation, so unicode hyphens at line ends are joined too.
+        text = MEDICAL_CHAR_RE.sub(lambda m: MEDICAL_CHARS[m.group()], text)
+    if LINE_END_HYPHEN_RE.search(text):
+        text = DEHYPHENATE_RE.sub(r"\1\2", text)
+    text = WHITESPACE_RE.sub(" ", text).strip()
+    if text.isdecimal():
+        return ""
+
+    if medical:
+        text = MICROGRAM_RE.sub("mcg", text)
+        text = UNIT_SPACING_RE.sub(r"\1 \2", text)
+        if "/" in text:
+            text = UNIT_RATIO_RE.sub(r"\1/\2", text)
+    return text
@@ -0,0 +1,83 @@
+"""
+ocr.py
+======
+
+Shared OCR helpers: a bounded, memoised Tesseract thread pool (used for
+embedded images and for scanned pages) and page rendering through pypdfium2.
+"""
+
+import hashlib
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Dict, NamedTuple, Optional
+
+import pypdfium2 as pdfium
+import pytesseract
+from PIL import Image
+
+from metrics import METRICS
+
+
+class OcrSettings(NamedTuple):
+    """Page OCR fallback: pages whose vector text is shorter than ``min_chars``
+    are rendered at ``dpi`` and OCR'd on ``workers`` threads.
+
+    ``tesseract_cmd`` travels with the settings so worker processes that do
+    not inherit the parent's pytesseract configuration still find it.
+    """
+
+    dpi: int = 300
+    min_chars: int = 50
+    workers: Optional[int] = None
+    tesseract_cmd: Optional[str] = None
+
+
+class OcrPool:
+    """Bounded OCR thread pool memoised by image content hash.
+
+    Each pytesseract call waits on a tesseract subprocess, so threads overlap
+    the calls; the semaphore caps how many undecoded images are queued.
+    """
+
+    def __init__(self, workers: Optional[int] = None):
+        self.workers = workers or min(8, os.cpu_count() or 1)
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(self.workers * 4)
+        self.results = {}
+
+    def _ocr(self, image_bytes: bytes, labels: Dict) -> str:
+        try:
+            with METRICS.timer("ocr_seconds", **labels):
+                img = Image.open(BytesIO(image_bytes))
+                return pytesseract.image_to_string(img).strip()
+        finally:
+            self.slots.release()
+
+    def submit(self, image_bytes: bytes, stage: str = "ocr", document=None, page=None):
+        """Return a future with the OCR text of ``image_bytes``, reusing earlier results.
+
+        The call is timed as ``ocr_seconds`` under the given metric labels.
+        """
+        key = hashlib.sha1(image_bytes).hexdigest()
+        if key not in self.results:
+            self.slots.acquire()
+            labels = {"stage": stage, "document": document, "page": page}
+            self.results[key] = self.pool.submit(self._ocr, image_bytes, labels)
+        return self.results[key]
+
+    def close(self):
+        self.pool.shutdown()
+
+
+def render_page(doc: pdfium.PdfDocument, page_index: int, dpi: int) -> bytes:
+    """Render one page to grayscale PNG bytes at ``dpi``."""
+    page = doc[page_index]
+    try:
+        image = page.render(scale=dpi / 72, grayscale=True).to_pil()
+    finally:
+        page.close()
+    buffer = BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
@@ -0,0 +1,117 @@
+"""
+qa_index.py
+===========
+
+In-memory inverted index over Q&A pairs for topic-coherent sampling.
+
+Pairs are indexed by source document, category, key entity terms from the
+question, and (document, term). Each posting list is shuffled once and read
+through a forward-only cursor that skips pairs already drawn, so drawing
+every pair costs time linear in the total size of the postings, with no
+rescans of the pair table.
+"""
+
+import random
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
+
+
+TERM_RE = re.compile(r"[A-Za-z][A-Za-z\-]{2,}")
+
+# Question-template and function words that say nothing about the topic.
+STOPWORDS = frozenset(
+    """
+    what which who how why when where are is was were the and for from with
+    that this these those there their its into about can may could should
+    does did has have had been being of to in on at by as an a or not
+    she her hers his him they them you your our its also
+    symptoms symptom treated treatment causes cause dose diagnosed risk
+    factors complications prevented
+    """.split()
+)
+
+
+def key_terms(question: str) -> Tuple[str, ...]:
+    """Lower-cased content words of a question, in order and de-duplicated."""
+    terms = (t.lower() for t in TERM_RE.findall(question))
+    return tuple(dict.fromkeys(t for t in terms if t not in STOPWORDS))
+
+
+class QAIndex:
+    """Inverted index from document/category/term keys to Q&A pair positions."""
+
+    def __init__(self, qa_pairs: Sequence[Dict], rng: Optional[random.Random] = None):
+        self.qa_pairs = qa_pairs
+        self.rng = rng or random.Random()
+        self.used = bytearray(len(qa_pairs))
+        self.terms: List[Tuple[str, ...]] = []
+        self.postings: Dict[Hashable, List[int]] = defaultdict(list)
+        self.cursors: Dict[Hashable, int] = defaultdict(int)
+
+        for i, qa in enumerate(qa_pairs):
+            doc = qa["source_document"]
+            terms = key_terms(qa["question"])
+            self.terms.append(terms)
+            self.postings[("doc", doc)].append(i)
+            self.postings[("category", qa["category"])].append(i)
+            for term in terms:
+                self.postings[("term", term)].append(i)
+                self.postings[("doc_term", doc, term)].append(i)
+
+        for positions in self.postings.values():
+            self.rng.shuffle(positions)
+        self.order = list(range(len(qa_pairs)))
+        self.rng.shuffle(self.order)
+        self.postings["all"] = self.order
+
+    def take(self, key: Hashable, k: int) -> List[int]:
+        """Draw up to ``k`` unused pairs from one posting list."""
+        positions = self.postings.get(key)
+        if not positions or k <= 0:
+            return []
+        picked = []
+        cursor = self.cursors[key]
+        while cursor < len(positions) and len(picked) < k:
+            i = positions[cursor]
+            cursor += 1
+            if not self.used[i]:
+                self.used[i] = 1
+                picked.append(i)
+        self.cursors[key] = cursor
+        return picked
+
+    def draw_related(self, k: int) -> List[int]:
+        """Draw a random seed pair plus up to ``k - 1`` related unused pairs.
+
+        Related pairs are looked up from the most to the least specific key:
+        same document and term, same document, same term, same category, and
+        finally any unused pair.
+        """
+        picked = self.take("all", 1)
+        if not picked:
+            return picked
+        seed = self.qa_pairs[picked[0]]
+        doc, terms = seed["source_document"], self.terms[picked[0]]
+        keys = (
+            [("doc_term", doc, t) for t in terms]
+            + [("doc", doc)]
+            + [("term", t) for t in terms]
+            + [("category", seed["category"]), "all"]
+        )
+        for key in keys:
+            if len(picked) >= k:
+                break
+            picked += self.take(key, k - len(picked))
+        return picked
+
+    def topic(self, positions: Sequence[int]) -> str:
+        """Short topic label: the most shared key term, else the source document."""
+        counts = Counter(t for i in positions for t in self.terms[i])
+        if counts:
+            term, count = counts.most_common(1)[0]
+            if count > 1:
+                return term.capitalize()
+        doc = self.qa_pairs[positions[0]]["source_document"]
+        return Path(doc).stem.replace("_", " ").title()
@@ -0,0 +1,166 @@
+"""
+qa_rules.py
+===========
+
+Registry of rule-based Q&A extractors.
+
+Each rule pairs a precompiled pattern with one or more literal anchors that
+must occur in a sentence for the pattern to possibly match. Rules are indexed
+by an anchor keyword, so most sentences are rejected after a single
+tokenisation pass without running any rule pattern.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Pattern, Tuple
+
+
+@dataclass(frozen=True)
+class QARule:
+    name: str
+    category: str
+    pattern: Pattern
+    anchors: Tuple[str, ...]
+    build: Callable[["re.Match"], Tuple[str, str]]
+
+
+RULES: List[QARule] = []
+
+
+def register(
+    name: str,
+    category: str,
+    pattern: str,
+    anchors: Iterable[str],
+    question: str,
+    answer_group: int = -1,
+    answer_rstrip: str = "",
+) -> QARule:
+    """Register a rule whose question is ``question.format(*groups)``.
+
+    The answer is the stripped ``answer_group`` match group, with any trailing
+    ``answer_rstrip`` characters removed.
+    """
+    def build(match):
+        groups = [g.strip() for g in match.groups()]
+        return question.format(*groups), groups[answer_group].rstrip(answer_rstrip)
+
+    rule = QARule(name, category, re.compile(pattern), tuple(anchors), build)
+    RULES.append(rule)
+    return rule
+
+
+WORD_RE = re.compile(r"[A-Za-z]+")
+
+
+def anchor_key(anchor: str) -> str:
+    """The longest word of an anchor; a sentence must contain it as a token."""
+    return max(WORD_RE.findall(anchor), key=len)
+
+
+class RuleSet:
+    """Rules indexed by anchor keyword.
+
+    A sentence is tokenised once and only the rules keyed by one of its
+    tokens are considered, so the cost per sentence stays roughly flat as
+    rules are added. Candidate rules then need a full anchor substring match
+    before their regex runs.
+    """
+
+    def __init__(self, rules: Optional[Iterable[QARule]] = None):
+        self.rules = list(RULES if rules is None else rules)
+        self.index: Dict[str, List[int]] = {}
+        for position, rule in enumerate(self.rules):
+            for key in {anchor_key(a) for a in rule.anchors}:
+                self.index.setdefault(key, []).append(position)
+
+    @property
+    def categories(self) -> List[str]:
+        return list(dict.fromkeys(r.category for r in self.rules))
+
+    def match(self, sentence: str) -> List[Tuple[QARule, str, str]]:
+        """Return ``(rule, question, answer)`` for every rule matching ``sentence``."""
+        keys = self.index.keys() & WORD_RE.findall(sentence)
+        if not keys:
+            return []
+        candidates = sorted({p for key in keys for p in self.index[key]})
+        hits = []
+        for position in candidates:
+            rule = self.rules[position]
+            if not any(a in sentence for a in rule.anchors):
+                continue
+            m = rule.pattern.match(sentence)
+            if m:
+                question, answer = rule.build(m)
+                hits.append((rule, question, answer))
+        return hits
+
+
+# === Built-in rules (registration order is output order) ===
+register(
+    "definition",
+    "definition",
+    r"^([A-Z][a-zA-Z\s\-]+?) is (a|an|the) (.+)",
+    [" is a ", " is an ", " is the "],
+    "What is {0}?",
+    answer_rstrip=".",
+)
+register(
+    "symptoms",
+    "symptoms",
+    r"^Symptoms of (.+?) include (.+?)\.",
+    ["Symptoms of "],
+    "What are the symptoms of {0}?",
+)
+register(
+    "treatment",
+    "treatment",
+    r"^Treatment of (.+?) includes (.+?)\.",
+    ["Treatment of "],
+    "How is {0} treated?",
+)
+register(
+    "cause",
+    "cause",
+    r"^(.+?) is caused by (.+?)\.",
+    [" is caused by "],
+    "What causes {0}?",
+)
+register(
+    "dosage",
+    "dosage",
+    r"^The (?:recommended |usual |adult |paediatric |pediatric )?dose of (.+?) is (.+?)\.",
+    ["dose of "],
+    "What is the dose of {0}?",
+)
+register(
+    "diagnosis",
+    "diagnosis",
+    r"^(.+?) is diagnosed (?:by|with|using|through) (.+?)\.",
+    [" is diagnosed "],
+    "How is {0} diagnosed?",
+)
+register(
+    "risk_factors",
+    "risk_factors",
+    r"^Risk factors (?:for|of) (.+?) include (.+?)\.",
+    ["Risk factors "],
+    "What are the risk factors for {0}?",
+)
+register(
+    "complications",
+    "complications",
+    r"^Complications of (.+?) include (.+?)\.",
+    ["Complications of "],
+    "What are the complications of {0}?",
+)
+register(
+    "prevention",
+    "prevention",
+    r"^(.+?) can be prevented by (.+?)\.",
+    [" can be prevented by "],
+    "How can {0} be prevented?",
+)
+
+DEFAULT_RULESET = RuleSet()
+CATEGORIES: List[str] = DEFAULT_RULESET.categories
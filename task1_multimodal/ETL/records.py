@@ -0,0 +1,129 @@
+"""
+records.py
+==========
+
+Streaming page-record format shared by the ETL stages.
+
+Each line of a ``.jsonl`` file is one page::
+
+    {"filename": "...", "processed_at": "...", "page": 1, "text": "...", ...}
+
+Pages of a document are written contiguously and in page order, so stages can
+regroup them per document with a generator and never hold the corpus in memory.
+The legacy combined JSON (a list of ``{"filename", "pages": [...]}`` documents)
+is still accepted as input and can be produced with ``export_json``.
+"""
+
+import json
+import re
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+DOC_FIELDS = ("filename", "processed_at")
+
+
+def write_record(f, record: Dict[str, Any]):
+    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def tee_jsonl(records: Iterable[Dict[str, Any]], path: Path) -> Iterator[Dict[str, Any]]:
+    """Write each record to a JSONL file while passing it downstream."""
+    with open(path, "w", encoding="utf-8") as f:
+        for record in records:
+            write_record(f, record)
+            yield record
+
+
+def iter_page_records(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yield page records from a JSONL file (or a legacy combined JSON file)."""
+    path = Path(path)
+    with open(path, "r", encoding="utf-8") as f:
+        if path.suffix != ".json":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+            return
+        docs = json.load(f)
+
+    for doc in docs:
+        doc_fields = {k: v for k, v in doc.items() if k != "pages"}
+        for page in doc.get("pages", []):
+            yield {**doc_fields, **page}
+
+
+def iter_json_array(path: Path, key: str, chunk_size: int = 1 << 16) -> Iterator[Any]:
+    """Yield the items of the ``key`` array of a JSON object file, one at a time.
+
+    An incremental ``json.load`` for large outputs such as
+    ``image_text_pairs.json``: only the current item is held in memory. The
+    array starts at the first ``"key": [`` in the file and its items must be
+    objects or arrays (a bare number cut at a read boundary would parse short).
+    """
+    decoder = json.JSONDecoder()
+    start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+    with open(path, "r", encoding="utf-8") as f:
+        buf = ""
+        match = None
+        while match is None:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            buf += chunk
+            match = start.search(buf)
+        pos = match.end()
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos == len(buf):
+                    raise json.JSONDecodeError("Unterminated array", buf, pos)
+                item, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    raise
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            yield item
+
+
+def iter_documents(
+    records: Iterable[Dict[str, Any]]
+) -> Iterator[Tuple[str, Iterator[Dict[str, Any]]]]:
+    """Group consecutive page records by filename."""
+    return groupby(records, key=itemgetter("filename"))
+
+
+def pages_to_document(filename: str, pages: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+    """Fold one document's page records back into the legacy document shape."""
+    doc: Dict[str, Any] = {"filename": filename}
+    doc_pages: List[Dict[str, Any]] = []
+    for record in pages:
+        for key in DOC_FIELDS:
+            if key in record:
+                doc.setdefault(key, record[key])
+        doc_pages.append({k: v for k, v in record.items() if k not in DOC_FIELDS})
+    doc["pages"] = doc_pages
+    return doc
+
+
+def export_json(records: Iterable[Dict[str, Any]], json_path: Path) -> int:
+    """Write records as the legacy indented combined JSON, one document at a time."""
+    n_docs = 0
+    with open(json_path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for filename, pages in iter_documents(records):
+            doc_json = json.dumps(
+                pages_to_document(filename, pages), ensure_ascii=False, indent=2
+            )
+            f.write(",\n  " if n_docs else "\n  ")
+            f.write(doc_json.replace("\n", "\n  "))
+            n_docs += 1
+        f.write("\n]" if n_docs else "]")
+    return n_docs
@@ -1,10 +1,9 @@
 #!/bin/bash
+set -e
 
 echo "🚀 Starting ETL process..."
 
-python 1-extract_text.py
-python 2-transform_load.py
-python 3-generate_qa_pairs.py
-python 4-create_conversations.py
+# All stages run in one interpreter; pass e.g. --stages transform,qa to run a subset.
+python etl.py "$@"
 
 echo "✅ ETL pipeline finished successfully!"
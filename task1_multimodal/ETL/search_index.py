@@ -0,0 +1,223 @@
+"""
+search_index.py
+===============
+
+Purpose:
+--------
+SQLite FTS5 full-text index over extracted pages and Q&A pairs, plus a small
+query API / CLI returning ranked hits with source references.
+
+- ``pages_fts`` is filled from the annotated page records in stage 2
+  (page text with filename/page/chapter/section metadata).
+- ``qa_fts`` is an external-content index over the ``qa_pairs`` table,
+  rebuilt after each stage 3 load.
+
+Usage::
+
+    python search_index.py "oral rehydration" --kind qa --limit 5
+"""
+
+import argparse
+import logging
+import re
+import sqlite3
+import time
+from itertools import chain, zip_longest
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List
+
+from metrics import METRICS
+from storage import DEFAULT_BATCH_SIZE, connect, insert_many
+
+
+# === Logging Setup ===
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s [%(levelname)s] %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+logger = logging.getLogger("search_index")
+
+PAGE_COLUMNS = ("text", "chapter", "section", "subsection", "filename", "page")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def ensure_page_index(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS pages_fts USING fts5(
+            text, chapter, section, subsection,
+            filename UNINDEXED, page UNINDEXED,
+            tokenize = 'porter unicode61'
+        )
+        """
+    )
+
+
+def ensure_qa_index(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS qa_fts USING fts5(
+            question, answer,
+            content = 'qa_pairs', content_rowid = 'rowid',
+            tokenize = 'porter unicode61'
+        )
+        """
+    )
+
+
+def index_pages(
+    records: Iterable[Dict], db_path: Path, batch_size: int = DEFAULT_BATCH_SIZE
+) -> Iterator[Dict]:
+    """Replace ``pages_fts`` with ``records`` while passing each record downstream."""
+    sql = f"INSERT INTO pages_fts VALUES ({', '.join('?' for _ in PAGE_COLUMNS)})"
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    conn = connect(db_path)
+    n_pages = 0
+    try:
+        ensure_page_index(conn)
+        with conn:
+            conn.execute("DELETE FROM pages_fts")
+        pending = []
+        for record in records:
+            pending.append(tuple(record.get(c) for c in PAGE_COLUMNS))
+            if len(pending) >= batch_size:
+                with METRICS.timer("sqlite_seconds", "transform", table="pages_fts"):
+                    n_pages += insert_many(conn, sql, pending, batch_size)
+                pending = []
+            yield record
+        with METRICS.timer("sqlite_seconds", "transform", table="pages_fts"):
+            n_pages += insert_many(conn, sql, pending, batch_size)
+        METRICS.count("rows_written", n_pages, "transform", table="pages_fts")
+    finally:
+        conn.close()
+    logger.info(f"🔎 Indexed {n_pages} pages for full-text search in: {db_path}")
+
+
+def rebuild_qa_index(conn: sqlite3.Connection):
+    """Re-sync ``qa_fts`` with the current contents of ``qa_pairs``."""
+    ensure_qa_index(conn)
+    with conn:
+        conn.execute("INSERT INTO qa_fts(qa_fts) VALUES ('rebuild')")
+
+
+def has_table(conn: sqlite3.Connection, name: str) -> bool:
+    row = conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None
+
+
+def to_match_query(query: str, any_term: bool = False) -> str:
+    """Quote each token so user input never hits FTS5 query syntax."""
+    tokens = [f'"{t}"' for t in TOKEN_RE.findall(query)]
+    return (" OR " if any_term else " ").join(tokens)
+
+
+def search(
+    conn: sqlite3.Connection,
+    query: str,
+    kind: str = "all",
+    limit: int = 10,
+    any_term: bool = False,
+) -> List[Dict]:
+    """Return BM25-ranked hits (lower score is better) with source references.
+
+    BM25 scores of ``pages_fts`` and ``qa_fts`` are not comparable (different
+    columns and statistics), so with ``kind="all"`` the two ranked lists are
+    interleaved by their ``rank`` within each table rather than sorted together.
+    """
+    match = to_match_query(query, any_term)
+    if not match:
+        return []
+
+    page_hits = qa_hits = []
+    if kind in ("pages", "all") and has_table(conn, "pages_fts"):
+        rows = conn.execute(
+            """
+            SELECT bm25(pages_fts), filename, page, chapter, section,
+                   snippet(pages_fts, 0, '[', ']', '…', 16)
+            FROM pages_fts WHERE pages_fts MATCH ?
+            ORDER BY rank LIMIT ?
+            """,
+            (match, limit),
+        )
+        page_hits = [
+            {
+                "kind": "page",
+                "rank": rank,
+                "score": score,
+                "source_reference": f"{filename}:p{page}",
+                "chapter": chapter,
+                "section": section,
+                "snippet": snippet,
+            }
+            for rank, (score, filename, page, chapter, section, snippet) in enumerate(
+                rows, start=1
+            )
+        ]
+    if kind in ("qa", "all") and has_table(conn, "qa_fts"):
+        rows = conn.execute(
+            """
+            SELECT bm25(qa_fts), q.id, q.source_document, q.page_number,
+                   q.category, q.question, q.answer
+            FROM qa_fts JOIN qa_pairs q ON q.rowid = qa_fts.rowid
+            WHERE qa_fts MATCH ?
+            ORDER BY rank LIMIT ?
+            """,
+            (match, limit),
+        )
+        qa_hits = [
+            {
+                "kind": "qa",
+                "rank": rank,
+                "score": score,
+                "id": qa_id,
+                "source_reference": f"{doc}:p{page}",
+                "category": category,
+                "question": question,
+                "answer": answer,
+            }
+            for rank, (score, qa_id, doc, page, category, question, answer) in enumerate(
+                rows, start=1
+            )
+        ]
+
+    hits = [h for h in chain.from_iterable(zip_longest(page_hits, qa_hits)) if h is not None]
+    return hits[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Query the full-text index over pages and Q&A pairs."
+    )
+    parser.add_argument("query", type=str, help="Search terms")
+    parser.add_argument(
+        "--db", type=str, default="outputs/qa_data.db", help="Path to SQLite database"
+    )
+    parser.add_argument(
+        "--kind", choices=["all", "pages", "qa"], default="all", help="What to search"
+    )
+    parser.add_argument("--limit", type=int, default=10, help="Maximum number of hits")
+    parser.add_argument(
+        "--any", action="store_true", help="Match any term instead of all terms"
+    )
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    started = time.perf_counter()
+    hits = search(conn, args.query, kind=args.kind, limit=args.limit, any_term=args.any)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    conn.close()
+
+    for rank, hit in enumerate(hits, start=1):
+        if hit["kind"] == "page":
+            print(f"{rank:>2}. [page] {hit['source_reference']} ({hit['score']:.2f})")
+            print(f"    {hit['snippet']}")
+        else:
+            print(f"{rank:>2}. [qa]   {hit['source_reference']} ({hit['score']:.2f})")
+            print(f"    Q: {hit['question']}")
+            print(f"    A: {hit['answer']}")
+    logger.info(f"{len(hits)} hits in {elapsed_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
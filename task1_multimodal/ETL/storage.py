@@ -0,0 +1,191 @@
+"""
+storage.py
+==========
+
+SQLite storage layer shared by the Q&A and conversation stages.
+
+Rows are written with chunked ``executemany`` inside one transaction per
+call, on a connection opened with configurable journal/sync pragmas (WAL and
+``synchronous=NORMAL`` by default). Q&A ids are derived from content, so
+re-running the pipeline replaces rows instead of colliding with them.
+"""
+
+import argparse
+import hashlib
+import sqlite3
+from itertools import islice
+from pathlib import Path
+from typing import Dict, Iterable, Sequence
+
+
+DEFAULT_BATCH_SIZE = 10_000
+DEFAULT_CACHE_MB = 64
+JOURNAL_MODES = ["DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"]
+SYNCHRONOUS_MODES = ["OFF", "NORMAL", "FULL", "EXTRA"]
+
+QA_COLUMNS = (
+    "id",
+    "question",
+    "answer",
+    "source_document",
+    "page_number",
+    "created_at",
+    "category",
+)
+CONVERSATION_COLUMNS = ("conversation_id", "topic", "created_at", "content")
+
+
+def add_storage_arguments(parser: argparse.ArgumentParser):
+    """Add the shared SQLite tuning flags to a stage's argument parser."""
+    parser.add_argument(
+        "--journal-mode",
+        type=str.upper,
+        choices=JOURNAL_MODES,
+        default="WAL",
+        help="SQLite journal mode",
+    )
+    parser.add_argument(
+        "--synchronous",
+        type=str.upper,
+        choices=SYNCHRONOUS_MODES,
+        default="NORMAL",
+        help="SQLite synchronous setting",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        help="Rows per executemany batch",
+    )
+
+
+def connect(
+    db_path: Path,
+    journal_mode: str = "WAL",
+    synchronous: str = "NORMAL",
+    cache_mb: int = DEFAULT_CACHE_MB,
+) -> sqlite3.Connection:
+    """Open ``db_path`` with the given journal, sync and page-cache pragmas."""
+    if journal_mode.upper() not in JOURNAL_MODES:
+        raise ValueError(f"Unknown journal mode: {journal_mode}")
+    if synchronous.upper() not in SYNCHRONOUS_MODES:
+        raise ValueError(f"Unknown synchronous mode: {synchronous}")
+    conn = sqlite3.connect(db_path)
+    conn.execute(f"PRAGMA journal_mode={journal_mode}")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_mb) * 1024}")
+    return conn
+
+
+def stable_id(prefix: str, *parts) -> str:
+    """Content-derived id: the same parts always give the same id."""
+    digest = hashlib.sha1("\x1f".join(map(str, parts)).encode("utf-8")).hexdigest()
+    return f"{prefix}_{digest[:16]}"
+
+
+def insert_many(
+    conn: sqlite3.Connection,
+    sql: str,
+    rows: Iterable[Sequence],
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> int:
+    """Insert ``rows`` in ``executemany`` chunks within a single transaction."""
+    rows = iter(rows)
+    n_rows = 0
+    with conn:
+        while True:
+            chunk = list(islice(rows, batch_size))
+            if not chunk:
+                break
+            conn.executemany(sql, chunk)
+            n_rows += len(chunk)
+    return n_rows
+
+
+def ensure_qa_schema(conn: sqlite3.Connection, indexes: bool = True):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS qa_pairs (
+            id TEXT PRIMARY KEY,
+            question TEXT,
+            answer TEXT,
+            source_document TEXT,
+            page_number INTEGER,
+            created_at TEXT,
+            category TEXT
+        )
+        """
+    )
+    if indexes:
+        create_qa_indexes(conn)
+
+
+def create_qa_indexes(conn: sqlite3.Connection):
+    conn.executescript(
+        """
+        CREATE INDEX IF NOT EXISTS idx_qa_pairs_source_document ON qa_pairs (source_document);
+        CREATE INDEX IF NOT EXISTS idx_qa_pairs_page_number ON qa_pairs (page_number);
+        CREATE INDEX IF NOT EXISTS idx_qa_pairs_category ON qa_pairs (category);
+        """
+    )
+
+
+def drop_qa_indexes(conn: sqlite3.Connection):
+    conn.executescript(
+        """
+        DROP INDEX IF EXISTS idx_qa_pairs_source_document;
+        DROP INDEX IF EXISTS idx_qa_pairs_page_number;
+        DROP INDEX IF EXISTS idx_qa_pairs_category;
+        """
+    )
+
+
+def ensure_conversation_schema(conn: sqlite3.Connection):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS conversations (
+            conversation_id TEXT PRIMARY KEY,
+            topic TEXT,
+            created_at TEXT,
+            content TEXT
+        )
+        """
+    )
+
+
+def save_qa_pairs(
+    conn: sqlite3.Connection, qa_pairs: Iterable[Dict], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Replace the stored Q&A pairs; indexes are built after the bulk load.
+
+    Ids are content-derived, so without the reset rows from earlier runs
+    (changed text, a lower limit, removed PDFs) would linger next to the new ones.
+    """
+    ensure_qa_schema(conn, indexes=False)
+    with conn:
+        conn.execute("DELETE FROM qa_pairs")
+    drop_qa_indexes(conn)
+    n_rows = insert_many(
+        conn,
+        f"INSERT OR REPLACE INTO qa_pairs VALUES ({', '.join('?' for _ in QA_COLUMNS)})",
+        (tuple(qa[c] for c in QA_COLUMNS) for qa in qa_pairs),
+        batch_size,
+    )
+    create_qa_indexes(conn)
+    return n_rows
+
+
+def save_conversation_rows(
+    conn: sqlite3.Connection, rows: Iterable[Sequence], batch_size: int = DEFAULT_BATCH_SIZE
+) -> int:
+    """Insert ``(conversation_id, topic, created_at, content)`` rows."""
+    ensure_conversation_schema(conn)
+    return insert_many(
+        conn,
+        f"""
+        INSERT OR REPLACE INTO conversations ({', '.join(CONVERSATION_COLUMNS)})
+        VALUES ({', '.join('?' for _ in CONVERSATION_COLUMNS)})
+        """,
+        rows,
+        batch_size,
+    )